@@ -18,7 +18,8 @@ class DatabaseController(object):
         c = self.connection.cursor()
         columns = [fld.column_ref for fld in tb_ctrl.field_controllers]
         try:
-            c.execute("SELECT %s FROM %s;"
+            # In the insertion order: the references walk, then the ids.
+            c.execute("SELECT %s FROM %s ORDER BY rowid;"
                       % (','.join(columns), tb_ctrl.table_ref))
             return c.fetchall()
         except:
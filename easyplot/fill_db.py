@@ -5,10 +5,10 @@ Module defining the database schema (SQLite3 is used) and providing methods
 related to database access.
 """
 
-from contextlib import contextmanager
 import os
 import csv
 import sqlite3
+from itertools import islice
 
 
 NC_PIPPN_COLUMNS = {
@@ -30,30 +30,21 @@ STRATAS = {
 
 BASE = os.path.dirname(__file__)
 
-
-@contextmanager
-def get_cursor(file_path):
-    connection = None
-    try:
-        connection = sqlite3.connect(file_path)
-        yield connection.cursor()
-        connection.commit()
-    except:
-        if connection is not None:
-            connection.rollback()
-        raise
-    finally:
-        if connection is not None:
-            connection.close()
+# Number of csv rows inserted at a time.
+INSERT_BATCH_SIZE = 10000
 
 
-def load_nc_pippn(nc_pippn_csv):
+def iter_nc_pippn(nc_pippn_csv):
+    """
+    Iterate over the rows of a NCPIPPN csv file, skipping its header, as
+    lists of the values of the id, specie, strata, circumference,
+    wood_density and height columns. The file is read one row at a time.
+    """
     with open(nc_pippn_csv, 'r') as csvfile:
         ncpippn = csv.reader(csvfile, delimiter=';')
         cols = ('id', 'specie', 'strata', 'circumference',
                 'wood_density', 'height')
         idx = [NC_PIPPN_COLUMNS[k] for k in cols]
-        data = list()
         for j, row in enumerate(ncpippn):
             if j == 0:
                 continue
@@ -61,16 +52,36 @@ def load_nc_pippn(nc_pippn_csv):
             for i, col in enumerate(cols):
                 v = row[idx[i]]
                 if col == 'strata':
+                    if v not in STRATAS:
+                        raise ValueError("{}, line {}: unknown strata '{}'."
+                                         .format(nc_pippn_csv, j + 1, v))
                     values.append(str(STRATAS[v]))
                 else:
                     values.append(v.replace(',', '.'))
-            data.append(values)
-        return data
+            yield values
 
 
-def make_ncpippn_db(nc_pippn_csv, db_path):
-    data = load_nc_pippn(nc_pippn_csv)
-    with get_cursor(db_path) as cursor:
+def load_nc_pippn(nc_pippn_csv):
+    return list(iter_nc_pippn(nc_pippn_csv))
+
+
+def make_ncpippn_db(nc_pippn_csv, db_path, batch_size=INSERT_BATCH_SIZE):
+    """
+    Import a NCPIPPN csv file into a new ncpippn database, streaming its
+    rows into bulk inserts of batch_size rows. The table is created and
+    filled in a single transaction, rolled back on error (e.g. an unknown
+    strata), so that a failed import leaves no table behind. Return the
+    number of imported rows.
+    """
+    rows = iter_nc_pippn(nc_pippn_csv)
+    count = 0
+    connection = sqlite3.connect(db_path)
+    # Explicit transaction: the sqlite3 module would otherwise commit
+    # before the CREATE TABLE on Python < 3.6.
+    connection.isolation_level = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("BEGIN;")
         cursor.execute(
             """
             CREATE TABLE ncpippn (
@@ -85,17 +96,26 @@ def make_ncpippn_db(nc_pippn_csv, db_path):
                 azimuth REAL
             );
             """)
-        for row in data:
-            cursor.execute(
+        while True:
+            batch = [row + ['', '', ''] for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            cursor.executemany(
                 """
                 INSERT INTO ncpippn (id, specie, strata, circumference,
                                      wood_density, height, reference, hdist,
                                      azimuth)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
-                """, row + ['', '', ''])
-
+                """, batch)
+            count += len(batch)
+        cursor.execute("COMMIT;")
+    except:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return count
 
-make_ncpippn_db('csv_templates/amoss.csv', 'databases/amoss.db')
 
 #
 # letters = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K']
@@ -120,3 +140,36 @@ make_ncpippn_db('csv_templates/amoss.csv', 'databases/amoss.db')
 #                 VALUES (?);""",
 #                 (i, ))
 # connection.commit()
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+
+    description = \
+        """
+        Imports a NCPIPPN csv file (';' delimited, with a header) into a new
+        ncpippn SQLite database, by bulk inserts, without loading the whole
+        file in memory.
+        """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'nc_pippn_csv',
+        help="The NCPIPPN csv file to import"
+    )
+    parser.add_argument(
+        'db_path',
+        help="The database to create"
+    )
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        default=INSERT_BATCH_SIZE,
+        help="The number of rows inserted at a time."
+    )
+
+    args = parser.parse_args()
+
+    count = make_ncpippn_db(args.nc_pippn_csv, args.db_path, args.batch_size)
+    print("{} rows imported into {}.".format(count, args.db_path))
@@ -0,0 +1,265 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import os
+import csv
+import time
+import shutil
+import sqlite3
+import tempfile
+import multiprocessing
+
+from easyplot_generator import generate_easyplot_dabatase, make_template, \
+    verify_easyplot_database, SCHEMA, OPTIMIZED_SCHEMA
+
+
+INDEX_COLUMNS = ('plot', 'database', 'start_id', 'end_id', 'ids', 'status',
+                 'seconds', 'message')
+
+
+def read_campaign_manifest(manifest, output_dir):
+    """
+    Read the plots of a campaign from a csv manifest. The manifest must
+    have a header with the 'plot', 'start_id' and 'end_id' columns, and may
+    have a 'database' column giving the file name of the database of a
+    plot (default: <plot>.epdb), relative to output_dir.
+    """
+    plots = []
+    with open(manifest, 'r') as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            try:
+                plot = row['plot'].strip()
+                if not plot:
+                    raise ValueError("empty plot name")
+                start_id = int(row['start_id'])
+                end_id = int(row['end_id'])
+                if start_id > end_id:
+                    raise ValueError("start_id greater than end_id")
+            except (KeyError, TypeError, AttributeError, ValueError) as e:
+                raise ValueError("{}, line {}: invalid entry ({})."
+                                 .format(manifest, line, e))
+            database = (row.get('database') or '').strip() or plot + '.epdb'
+            plots.append({
+                'plot': plot,
+                'database': os.path.join(output_dir, database),
+                'start_id': start_id,
+                'end_id': end_id,
+            })
+    return plots
+
+
+def check_campaign(plots):
+    """
+    Check that the plots of a campaign have distinct names and databases,
+    and that their id ranges do not overlap. Raise a ValueError listing
+    every problem otherwise.
+    """
+    problems = []
+    for key in ('plot', 'database'):
+        seen = set()
+        for plot in plots:
+            if plot[key] in seen:
+                problems.append("duplicate {} '{}'".format(key, plot[key]))
+            seen.add(plot[key])
+    # Sorted by start, a range overlaps a previous one iff it starts before
+    # the largest previous end.
+    last = None
+    for plot in sorted(plots, key=lambda p: (p['start_id'], p['end_id'])):
+        if last is not None and plot['start_id'] <= last['end_id']:
+            problems.append(
+                "ids of '{}' ({}-{}) overlap those of '{}' ({}-{})".format(
+                    plot['plot'], plot['start_id'], plot['end_id'],
+                    last['plot'], last['start_id'], last['end_id']
+                )
+            )
+        if last is None or plot['end_id'] > last['end_id']:
+            last = plot
+    if problems:
+        raise ValueError("Invalid campaign:\n{}".format(
+            '\n'.join("  " + p for p in problems)
+        ))
+
+
+def generate_plot(plot):
+    """
+    Generate the database of a plot and return its status, never asking
+    anything: if the database already exists and overwriting is not
+    allowed, the plot is skipped, unless the database fails the
+    verification (see verify_easyplot_database), e.g. left partial by a
+    failed run, in which case it is generated again.
+    """
+    status = dict((k, plot.get(k)) for k in INDEX_COLUMNS)
+    status['ids'] = plot['end_id'] - plot['start_id'] + 1
+    if os.path.exists(plot['database']) and not plot.get('overwrite'):
+        try:
+            verify_easyplot_database(plot['database'], plot['start_id'],
+                                     plot['end_id'])
+            status['status'] = 'skipped'
+            status['message'] = "{} already exist.".format(plot['database'])
+            return status
+        except sqlite3.Error as e:
+            status['message'] = "Generated again, {} failed the " \
+                                "verification: {}".format(plot['database'], e)
+    start = time.time()
+    try:
+        if os.path.exists(plot['database']):
+            os.remove(plot['database'])
+        generate_easyplot_dabatase(plot['database'], plot['start_id'],
+                                   plot['end_id'], plot.get('template'))
+        status['status'] = 'ok'
+    except Exception as e:
+        status['status'] = 'error'
+        status['message'] = str(e)
+    status['seconds'] = round(time.time() - start, 3)
+    return status
+
+
+def generate_campaign(plots, processes=None, template_path=None,
+                      optimized=False):
+    """
+    Generate the databases of the plots of a campaign over a pool of
+    processes, once the campaign is checked (see check_campaign), and
+    return their statuses, in the order of the plots. Every database is a
+    copy of the template database template_path, with the ids of its plot.
+    By default, the template is built once for the campaign, with the
+    optimized layout if optimized is True.
+    """
+    check_campaign(plots)
+    if not plots:
+        return []
+    tmp_dir = None
+    if template_path is None:
+        tmp_dir = tempfile.mkdtemp(prefix='.template_')
+        template_path = make_template(
+            os.path.join(tmp_dir, 'template.epdb'),
+            OPTIMIZED_SCHEMA if optimized else SCHEMA
+        )
+    try:
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(generate_plot,
+                            [dict(plot, template=template_path)
+                             for plot in plots], chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def write_index(statuses, index_file):
+    """
+    Write the campaign index: the database and id range of each plot.
+    """
+    with open(index_file, 'w') as dest:
+        dest_writer = csv.writer(dest)
+        dest_writer.writerow(INDEX_COLUMNS)
+        for status in statuses:
+            dest_writer.writerow([status[k] for k in INDEX_COLUMNS])
+
+
+if __name__ == '__main__':
+
+    import sys
+    import argparse
+
+
+    def str2bool(v):
+        if v.lower() in ('yes', 'true', 't', 'y', '1'):
+            return True
+        if v.lower() in ('no', 'false', 'f', 'n', '0'):
+            return False
+        else:
+            raise argparse.ArgumentTypeError('Boolean value expected.')
+
+    description = \
+        """
+        Easyplot Campaign generates the easyplot databases of every plot of
+        a field campaign at once, over a pool of processes, from a csv
+        manifest of the plots and of their id ranges. The id ranges are
+        checked not to overlap, and an index of the generated databases is
+        written in the output directory.
+        """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'manifest',
+        help="""
+            A csv manifest with the 'plot', 'start_id' and 'end_id'
+            columns, and optionally a 'database' column (default:
+            <plot>.epdb).
+            """
+    )
+    parser.add_argument(
+        'output_dir',
+        help="The output directory"
+    )
+    parser.add_argument(
+        '--overwrite',
+        type=str2bool,
+        default=False,
+        help="""
+            Overwrite the existing databases. Else, the plots whose database
+            already exists are skipped (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="The number of worker processes (default: the number of CPUs)"
+    )
+    parser.add_argument(
+        '--template',
+        default=None,
+        help="""
+            A template database to clone, with the schema, the references
+            and any index (default: the standard schema and references).
+            """
+    )
+    parser.add_argument(
+        '--optimized',
+        type=str2bool,
+        default=False,
+        help="""
+            Generate the databases with the optimized layout (see
+            easyplot_generator.py), unless --template is given
+            (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--index',
+        default=None,
+        help="The index csv file (default: <output_dir>/index.csv)"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        plots = read_campaign_manifest(args.manifest, args.output_dir)
+        check_campaign(plots)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    for plot in plots:
+        plot['overwrite'] = args.overwrite
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    statuses = generate_campaign(plots, args.processes, args.template,
+                                 args.optimized)
+
+    index_file = args.index
+    if index_file is None:
+        index_file = os.path.join(args.output_dir, 'index.csv')
+    write_index(statuses, index_file)
+
+    counts = {}
+    for status in statuses:
+        counts[status['status']] = counts.get(status['status'], 0) + 1
+    print("{} databases generated ({}), index written to {}."
+          .format(len(statuses),
+                  ', '.join("{} {}".format(v, k)
+                            for k, v in sorted(counts.items())),
+                  index_file))
@@ -1,6 +1,8 @@
 #!/usr/bin/python
 # coding: utf-8
 
+import os
+import shutil
 import sqlite3
 
 
@@ -22,51 +24,154 @@ def generate_references():
     return refs
 
 
-def generate_easyplot_dabatase(database_path, start_id, end_id):
-    refs = ["('{}')".format(i) for i in generate_references()]
-    sql = \
-        """
-        DROP TABLE IF EXISTS ncpippn;
-        CREATE TABLE ncpippn (
-            id TEXT PRIMARY KEY,
-            quadrat TEXT,
-            strata INTEGER,
-            circumferences TEXT,
-            dbh REAL,
-            height REAL,
-            reference TEXT,
-            hdist REAL,
-            azimuth REAL,
-            x REAL,
-            y REAL
-        );
-        /* First insert references */
-        INSERT INTO ncpippn (id) VALUES {};
-        """.format(','.join(refs))
+SCHEMA = \
+    """
+    DROP TABLE IF EXISTS ncpippn;
+    CREATE TABLE ncpippn (
+        id TEXT PRIMARY KEY,
+        quadrat TEXT,
+        strata INTEGER,
+        circumferences TEXT,
+        dbh REAL,
+        height REAL,
+        reference TEXT,
+        hdist REAL,
+        azimuth REAL,
+        x REAL,
+        y REAL
+    );
+    """
+
+# Indexes of the optimized layout, for the reference chain scans and the
+# per quadrat queries. The table itself is unchanged (a rowid table, so
+# the device still reads the rows in insertion order), and plain indexes
+# work with any SQLite 3 version, including the one of the device.
+OPTIMIZED_INDEXES = (
+    ('ncpippn_reference', 'reference'),
+    ('ncpippn_quadrat', 'quadrat'),
+)
+
+OPTIMIZED_SCHEMA = SCHEMA.rstrip() + '\n' + ''.join(
+    "    CREATE INDEX {} ON ncpippn ({});\n".format(name, column)
+    for name, column in OPTIMIZED_INDEXES
+)
+
+
+def make_template(template_path, schema=SCHEMA):
+    """
+    Build a template easyplot database in template_path, with the schema
+    and the fixed references, to be copied into new databases (see
+    clone_template). Return template_path.
+    """
+    connexion = sqlite3.connect(template_path)
+    try:
+        connexion.executescript(schema)
+        connexion.executemany("INSERT INTO ncpippn (id) VALUES (?);",
+                              ((ref,) for ref in generate_references()))
+        connexion.commit()
+    finally:
+        connexion.close()
+    return template_path
+
+
+def clone_template(template_path, database_path):
+    """
+    Copy a template database (see make_template, or any database generated
+    without any id) into database_path, replacing it if it exists.
+    """
+    shutil.copyfile(template_path, database_path)
+
+
+def generate_easyplot_dabatase(database_path, start_id, end_id,
+                               template=None, schema=SCHEMA):
+    """
+    Generate an easyplot database with the fixed references and the ids
+    from start_id to end_id, and verify it (see verify_easyplot_database).
+    The schema and the references are copied from the template database
+    file if given (see clone_template), else built with schema, then the
+    ids are inserted with parameterized bulk inserts in a single
+    transaction.
+    """
+    if template is None:
+        make_template(database_path, schema)
+    else:
+        clone_template(template, database_path)
+    connexion = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        cursor = connexion.cursor()
+        # The database is only usable once complete: no need for an on disk
+        # rollback journal nor for syncing while building it. A large page
+        # cache (256 MB) keeps the id index in memory.
+        cursor.execute("PRAGMA journal_mode = MEMORY;")
+        cursor.execute("PRAGMA synchronous = OFF;")
+        cursor.execute("PRAGMA cache_size = -262144;")
+        cursor.execute("BEGIN;")
+        try:
+            cursor.executemany("INSERT INTO ncpippn (id) VALUES (?);",
+                               ((str(i),) for i in
+                                range(start_id, end_id + 1)))
+            cursor.execute("COMMIT;")
+        except Exception:
+            cursor.execute("ROLLBACK;")
+            raise
+        cursor.execute("PRAGMA journal_mode = DELETE;")
+    finally:
+        connexion.close()
+    verify_easyplot_database(database_path, start_id, end_id)
+
+
+def is_optimized(connexion):
+    """
+    Tell whether a database has all the indexes of the optimized layout
+    (see OPTIMIZED_INDEXES).
+    """
+    names = set(row[0] for row in connexion.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = 'ncpippn';"
+    ))
+    return all(name in names for name, _ in OPTIMIZED_INDEXES)
+
+
+def verify_easyplot_database(database_path, start_id, end_id):
+    """
+    Check that a generated database holds the fixed references and the
+    ids from start_id to end_id, and that it is not corrupted. Raise a
+    sqlite3.DatabaseError describing the problem otherwise.
+    """
+    refs = generate_references()
     connexion = sqlite3.connect(database_path)
-    cursor = connexion.cursor()
-    cursor.executescript(sql)
-    BATCH_SIZE = 300
-    RANGE = range(start_id, end_id + 1)
-    for i in range((len(RANGE) // BATCH_SIZE) + 1):
-        start = RANGE[0] + i * BATCH_SIZE
-        if i != len(RANGE) // BATCH_SIZE:
-            end = RANGE[0] + (i + 1) * BATCH_SIZE
-        else:
-            end = RANGE[len(RANGE) - 1] + 1
-        vals = ["('{}')".format(k) for k in range(start, end)]
-        sql_bis = \
-            """
-            /* Insert identifiers */
-            INSERT INTO ncpippn (id) VALUES {};
-            """.format(','.join(vals))
+    try:
         cursor = connexion.cursor()
-        cursor.execute(sql_bis)
+        check = cursor.execute("PRAGMA quick_check;").fetchone()[0]
+        if check != 'ok':
+            raise sqlite3.DatabaseError("{} is corrupted: {}"
+                                        .format(database_path, check))
+        count = cursor.execute("SELECT count(*) FROM ncpippn;").fetchone()[0]
+        n_refs = cursor.execute(
+            "SELECT count(*) FROM ncpippn WHERE id IN ({});"
+            .format(', '.join('?' * len(refs))), refs
+        ).fetchone()[0]
+        first, last = cursor.execute(
+            "SELECT min(CAST(id AS INTEGER)), max(CAST(id AS INTEGER)) "
+            "FROM ncpippn WHERE id NOT IN ({});"
+            .format(', '.join('?' * len(refs))), refs
+        ).fetchone()
+    finally:
+        connexion.close()
+    n_ids = max(0, end_id - start_id + 1)
+    if n_refs != len(refs) or count != len(refs) + n_ids or \
+            (n_ids and (first, last) != (start_id, end_id)):
+        raise sqlite3.DatabaseError(
+            "{} is incomplete: {} rows, {} references, ids from {} to {} "
+            "(expected {} references and ids from {} to {})."
+            .format(database_path, count, n_refs, first, last, len(refs),
+                    start_id, end_id)
+        )
+
 
 if __name__ == '__main__':
 
     import sys
-    import os
     import argparse
 
 
@@ -105,6 +210,14 @@ if __name__ == '__main__':
                 sys.stdout.write("Please respond with 'yes' or 'no' "
                                  "(or 'y' or 'n').\n")
 
+    def str2bool(v):
+        if v.lower() in ('yes', 'true', 't', 'y', '1'):
+            return True
+        if v.lower() in ('no', 'false', 'f', 'n', '0'):
+            return False
+        else:
+            raise argparse.ArgumentTypeError('Boolean value expected.')
+
     description = \
         """
         Easyplot Generator generates a database for collecting field
@@ -125,6 +238,26 @@ if __name__ == '__main__':
         type=int,
         help="The ending id of the database to generate."
     )
+    parser.add_argument(
+        '--template',
+        default=None,
+        help="""
+            A template database to clone, with the schema, the references
+            and any index (for instance a database generated with an empty
+            id range, such as 1 0). Default: the standard schema and
+            references.
+            """
+    )
+    parser.add_argument(
+        '--optimized',
+        type=str2bool,
+        default=False,
+        help="""
+            Generate the database with the optimized layout, indexed by
+            reference and quadrat (boolean: True/False). Ignored with
+            --template.
+            """
+    )
 
     args = parser.parse_args()
     database_path = args.database_path
@@ -138,6 +271,8 @@ if __name__ == '__main__':
             print("Aborting...")
             sys.exit()
 
-    generate_easyplot_dabatase(database_path, start_id, end_id)
+    generate_easyplot_dabatase(database_path, start_id, end_id,
+                               args.template,
+                               OPTIMIZED_SCHEMA if args.optimized else SCHEMA)
     print("{} created with identifiers from {} to {}."
           .format(database_path, start_id, end_id))
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import os
+import shutil
+import sqlite3
+
+from easyplot_generator import OPTIMIZED_INDEXES, is_optimized
+
+
+def optimize_easyplot_database(database_path, output_path):
+    """
+    Write a copy of an easyplot database with the optimized layout (see
+    easyplot_generator.OPTIMIZED_INDEXES) to output_path, the original
+    database being left untouched. The copy is built next to output_path
+    and only moved there once complete. Return False if the database was
+    already optimized, True otherwise.
+    """
+    if os.path.abspath(database_path) == os.path.abspath(output_path):
+        raise ValueError("The optimized copy of {} cannot replace it."
+                         .format(database_path))
+    tmp_path = output_path + '.tmp'
+    try:
+        shutil.copyfile(database_path, tmp_path)
+        connexion = sqlite3.connect(tmp_path)
+        try:
+            optimized = is_optimized(connexion)
+            with connexion:
+                for name, column in OPTIMIZED_INDEXES:
+                    connexion.execute("CREATE INDEX IF NOT EXISTS {} ON "
+                                      "ncpippn ({});".format(name, column))
+        finally:
+            connexion.close()
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return not optimized
+
+
+def upgrade_databases(databases, output_dir, overwrite=False):
+    """
+    Write an optimized copy of easyplot databases in output_dir, under the
+    same file names (see optimize_easyplot_database), never modifying the
+    original databases. Return the status of each
+    database: the copy, 'upgraded', 'optimized' (already), 'skipped' (the
+    copy exists and overwrite is False) or 'error', and a message.
+    """
+    statuses = []
+    for database in databases:
+        output = os.path.join(output_dir, os.path.basename(database))
+        if os.path.exists(output) and not overwrite:
+            statuses.append((database, output, 'skipped',
+                             "{} already exist.".format(output)))
+            continue
+        try:
+            if optimize_easyplot_database(database, output):
+                statuses.append((database, output, 'upgraded', ''))
+            else:
+                statuses.append((database, output, 'optimized', ''))
+        except (sqlite3.Error, EnvironmentError, ValueError) as e:
+            statuses.append((database, output, 'error', str(e)))
+    return statuses
+
+
+if __name__ == '__main__':
+
+    import sys
+    import argparse
+
+
+    def str2bool(v):
+        if v.lower() in ('yes', 'true', 't', 'y', '1'):
+            return True
+        if v.lower() in ('no', 'false', 'f', 'n', '0'):
+            return False
+        else:
+            raise argparse.ArgumentTypeError('Boolean value expected.')
+
+    description = \
+        """
+        Easyplot Upgrade writes a copy of existing easyplot databases with
+        the optimized layout (indexed by reference and quadrat) in an output
+        directory. The original databases are never modified.
+        """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'databases',
+        nargs='+',
+        help="The easyplot databases (.epdb) to upgrade"
+    )
+    parser.add_argument(
+        'output_dir',
+        help="The output directory of the upgraded copies"
+    )
+    parser.add_argument(
+        '--overwrite',
+        type=str2bool,
+        default=False,
+        help="""
+            Overwrite the existing copies. Else, the databases whose copy
+            already exists are skipped (boolean: True/False).
+            """
+    )
+
+    args = parser.parse_args()
+
+    missing = [d for d in args.databases if not os.path.isfile(d)]
+    if missing:
+        print("Not found: {}".format(', '.join(missing)))
+        sys.exit(1)
+    names = [os.path.basename(d) for d in args.databases]
+    if len(set(names)) != len(names):
+        print("The databases must have distinct file names.")
+        sys.exit(1)
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    statuses = upgrade_databases(args.databases, args.output_dir,
+                                 args.overwrite)
+    for database, output, status, message in statuses:
+        print("{} -> {}: {}{}".format(database, output, status,
+                                      " ({})".format(message)
+                                      if message else ''))
+    if any(status == 'error' for _, _, status, _ in statuses):
+        sys.exit(1)
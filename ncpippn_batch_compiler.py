@@ -0,0 +1,449 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import os
+import csv
+import time
+import glob
+import multiprocessing
+
+from ncpippn_compiler import compile_data, CHUNK_SIZE, PLOT_BACKENDS
+from ncpippn_map import save_atlas
+
+
+# Options of compile_data that can be set per plot in a manifest.
+BOOL_OPTIONS = ('north_oriented', 'relative', 'letters_abscissa',
+                'force_0_100_bounds', 'output_plot_png')
+
+SUMMARY_COLUMNS = ('database', 'output_csv_file', 'output_plot_png',
+                   'status', 'seconds', 'message')
+
+
+def parse_bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    raise ValueError("Boolean value expected, got '{}'.".format(v))
+
+
+def make_job(database, plot_azimuth, output_dir, options,
+             plot=None):
+    """
+    Build a compilation job for a database, the outputs being named after
+    the plot if given, else after the database, in output_dir. options is
+    a dict of compile_data options (see BOOL_OPTIONS), and csv_separator,
+    plot_format, plot_backend, overwrite and chunk_size.
+    """
+    name = plot or os.path.splitext(os.path.basename(database))[0]
+    job = dict(options)
+    if plot:
+        job['plot'] = plot
+    job['database'] = database
+    job['plot_azimuth'] = plot_azimuth
+    job['output_csv_file'] = os.path.join(output_dir, name + '.csv')
+    if job['output_plot_png']:
+        job['output_plot_png'] = os.path.join(
+            output_dir, name + '.' + job.get('plot_format', 'png')
+        )
+    else:
+        job['output_plot_png'] = None
+    return job
+
+
+def jobs_from_directory(directory, plot_azimuth, output_dir, options):
+    """
+    Build a compilation job for every .epdb database in a directory, all
+    the plots sharing the same azimuth and options.
+    """
+    databases = sorted(glob.glob(os.path.join(directory, '*.epdb')))
+    return [make_job(db, plot_azimuth, output_dir, options)
+            for db in databases]
+
+
+def jobs_from_manifest(manifest, output_dir, options):
+    """
+    Build the compilation jobs listed in a csv manifest. The manifest must
+    have a header with at least the 'database' and 'plot_azimuth' columns,
+    and may have a column for any of the BOOL_OPTIONS, overriding the
+    default options for that plot, and a 'plot' column naming the plot and
+    its outputs (see make_job and ncpippn_warehouse.plot_name). Relative
+    database paths are relative to the manifest directory.
+    """
+    base = os.path.dirname(os.path.abspath(manifest))
+    jobs = []
+    with open(manifest, 'r') as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            try:
+                database = os.path.join(base, row['database'])
+                plot_azimuth = float(row['plot_azimuth'])
+                plot_options = dict(options)
+                for k in BOOL_OPTIONS:
+                    if row.get(k):
+                        plot_options[k] = parse_bool(row[k])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError("{}, line {}: invalid entry ({})."
+                                 .format(manifest, line, e))
+            jobs.append(make_job(database, plot_azimuth, output_dir,
+                                 plot_options,
+                                 (row.get('plot') or '').strip() or None))
+    return jobs
+
+
+def job_outputs(job):
+    return [o for o in (job['output_csv_file'], job['output_plot_png'])
+            if o is not None]
+
+
+def check_job_outputs(jobs):
+    """
+    Raise a ValueError listing the output files shared by several jobs (e.g.
+    same-named databases of different directories), if any: their
+    compilations would overwrite, or remove, each other's outputs.
+    """
+    seen = set()
+    duplicates = []
+    for job in jobs:
+        for o in job_outputs(job):
+            path = os.path.normcase(os.path.abspath(o))
+            if path in seen and path not in duplicates:
+                duplicates.append(path)
+            seen.add(path)
+    if duplicates:
+        raise ValueError("Outputs shared by several plots (name the plots "
+                         "with a 'plot' column in the manifest): {}."
+                         .format(', '.join(duplicates)))
+
+
+def output_done(path):
+    """
+    Tell whether an output file is there and not empty (an empty file is
+    left by a failed compilation of an older version).
+    """
+    return os.path.isfile(path) and os.path.getsize(path) > 0
+
+
+def job_status(job):
+    """
+    Return the initial status of a job: 'skipped' if all its outputs are
+    already done (see output_done) and overwriting is not allowed, else
+    None. The modification times of the existing outputs are recorded in
+    the status (see remove_job_outputs).
+    """
+    status = dict((k, job.get(k)) for k in SUMMARY_COLUMNS)
+    outputs = job_outputs(job)
+    if not job['overwrite'] and all(output_done(o) for o in outputs):
+        status['status'] = 'skipped'
+        status['message'] = "{} already exist.".format(', '.join(outputs))
+    status['mtimes'] = dict((o, os.path.getmtime(o)) for o in outputs
+                            if os.path.exists(o))
+    return status
+
+
+def remove_job_outputs(job, status):
+    """
+    Remove the outputs a failed job created or modified, so it is not
+    skipped the next time.
+    """
+    for o in job_outputs(job):
+        if os.path.exists(o) and \
+                os.path.getmtime(o) != status['mtimes'].get(o):
+            os.remove(o)
+
+
+def run_job(job):
+    """
+    Compile the database of a job and return its status, never asking
+    anything: if an output already exists and overwriting is not allowed,
+    the job is skipped.
+    """
+    status = job_status(job)
+    if status['status'] == 'skipped':
+        return status
+    start = time.time()
+    try:
+        compile_data(
+            job['database'],
+            job['output_csv_file'],
+            job['csv_separator'],
+            job['plot_azimuth'],
+            job['output_plot_png'],
+            job['north_oriented'],
+            job['relative'],
+            job['letters_abscissa'],
+            job['force_0_100_bounds'],
+            job['chunk_size'],
+            plot_backend=job.get('plot_backend', 'builtin')
+        )
+        status['status'] = 'ok'
+    except Exception as e:
+        status['status'] = 'error'
+        status['message'] = str(e)
+        remove_job_outputs(job, status)
+    status['seconds'] = round(time.time() - start, 3)
+    return status
+
+
+def compile_batch(jobs, processes=None):
+    """
+    Run the compilation jobs over a pool of processes and return their
+    statuses, in the order of the jobs. The jobs must have distinct outputs
+    (see check_job_outputs).
+    """
+    if not jobs:
+        return []
+    check_job_outputs(jobs)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(run_job, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def write_atlas(statuses, atlas_file, columns=4):
+    """
+    Write an svg atlas of the maps of the compiled (or skipped, up to date)
+    plots, in the order of the statuses.
+    """
+    maps = [(os.path.basename(status['database']), status['output_plot_png'])
+            for status in statuses
+            if status['status'] in ('ok', 'skipped') and
+            status['output_plot_png'] and
+            os.path.exists(status['output_plot_png'])]
+    save_atlas(atlas_file, maps, columns)
+    return len(maps)
+
+
+def write_summary(statuses, summary_file):
+    with open(summary_file, 'w') as dest:
+        dest_writer = csv.writer(dest)
+        dest_writer.writerow(SUMMARY_COLUMNS)
+        for status in statuses:
+            dest_writer.writerow([status[k] for k in SUMMARY_COLUMNS])
+
+
+if __name__ == '__main__':
+
+    import sys
+    import argparse
+
+
+    def str2bool(v):
+        try:
+            return parse_bool(v)
+        except ValueError:
+            raise argparse.ArgumentTypeError('Boolean value expected.')
+
+    description = \
+        """
+        NCPIPPN Batch Compiler compiles many easyplot databases at once, over
+        a pool of processes, without asking anything. The databases are
+        either every .epdb file of a directory, or the entries of a csv
+        manifest. A summary of the status of each plot is written in the
+        output directory.
+        """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'input',
+        help="""
+            A directory containing .epdb databases, or a csv manifest with
+            the 'database' and 'plot_azimuth' columns, and optionally one
+            column per boolean option.
+            """
+    )
+    parser.add_argument(
+        'output_dir',
+        help="The output directory"
+    )
+    parser.add_argument(
+        '--plot_azimuth',
+        type=float,
+        default=None,
+        help="The plot azimuth (float), required with a directory input"
+    )
+    parser.add_argument(
+        '--csv_separator',
+        default=',',
+        help="The separator character to use for writing the output csv files"
+    )
+    parser.add_argument(
+        '--output_plot_png',
+        type=str2bool,
+        default=False,
+        help="""
+            Generate a png representation of each plot, with the positions
+            of the trees (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--plot_format',
+        choices=('png', 'svg'),
+        default='png',
+        help="The format of the plot maps"
+    )
+    parser.add_argument(
+        '--plot_backend',
+        choices=PLOT_BACKENDS,
+        default='builtin',
+        help="""
+            The renderer of the plot maps: the built-in one (fast, no extra
+            dependency), or matplotlib (which must be installed).
+            """
+    )
+    parser.add_argument(
+        '--atlas',
+        default=None,
+        help="""
+            If specified (with --output_plot_png True), an svg atlas of all
+            the plot maps is written in this file.
+            """
+    )
+    parser.add_argument(
+        '--atlas_columns',
+        type=int,
+        default=4,
+        help="The number of plot maps per row of the atlas"
+    )
+    parser.add_argument(
+        '--north_oriented',
+        type=str2bool,
+        default=False,
+        help="""
+            Compute the x, y coordinates in the north oriented
+            coordinate system (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--relative',
+        type=str2bool,
+        default=False,
+        help="""
+            Compute the x, y coordinates in the north oriented using the
+            relative positioning of the references (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--letters_abscissa',
+        type=str2bool,
+        default=False,
+        help="""
+            If True, A0 -> K0 is considered as the abscissa. Else, A0 -> A10
+            is considered as the abscissa. (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--force_0_100_bounds',
+        type=str2bool,
+        default=True,
+        help="""
+            If True, the script will set negative tree position values to 0
+            and those exceeding 100 to 100.
+            """
+    )
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=CHUNK_SIZE,
+        help="The number of rows read and compiled at a time."
+    )
+    parser.add_argument(
+        '--overwrite',
+        type=str2bool,
+        default=False,
+        help="""
+            Overwrite the existing outputs. Else, the plots whose outputs
+            already exist are skipped (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="The number of worker processes (default: the number of CPUs)"
+    )
+    parser.add_argument(
+        '--pipeline',
+        type=str2bool,
+        default=False,
+        help="""
+            Compile the plots through an asyncio pipeline overlapping the
+            database reads, the computations and the csv/png writes of
+            different plots, each plot being held in memory as a whole
+            (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--io_threads',
+        type=int,
+        default=2,
+        help="The number of I/O threads of the pipeline"
+    )
+    parser.add_argument(
+        '--queue_size',
+        type=int,
+        default=2,
+        help="The number of plots waiting between two stages of the pipeline"
+    )
+    parser.add_argument(
+        '--summary',
+        default=None,
+        help="The summary csv file (default: <output_dir>/summary.csv)"
+    )
+
+    args = parser.parse_args()
+
+    options = {
+        'csv_separator': args.csv_separator,
+        'output_plot_png': args.output_plot_png,
+        'plot_format': args.plot_format,
+        'plot_backend': args.plot_backend,
+        'north_oriented': args.north_oriented,
+        'relative': args.relative,
+        'letters_abscissa': args.letters_abscissa,
+        'force_0_100_bounds': args.force_0_100_bounds,
+        'chunk_size': args.chunk_size,
+        'overwrite': args.overwrite,
+    }
+
+    if os.path.isdir(args.input):
+        if args.plot_azimuth is None:
+            parser.error("--plot_azimuth is required with a directory input")
+        jobs = jobs_from_directory(args.input, args.plot_azimuth,
+                                   args.output_dir, options)
+    else:
+        jobs = jobs_from_manifest(args.input, args.output_dir, options)
+    try:
+        check_job_outputs(jobs)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    if args.pipeline:
+        from ncpippn_pipeline import pipeline_compile_batch
+        statuses = pipeline_compile_batch(jobs, args.processes,
+                                          args.io_threads, args.queue_size)
+    else:
+        statuses = compile_batch(jobs, args.processes)
+
+    summary_file = args.summary
+    if summary_file is None:
+        summary_file = os.path.join(args.output_dir, 'summary.csv')
+    write_summary(statuses, summary_file)
+
+    counts = {}
+    for status in statuses:
+        counts[status['status']] = counts.get(status['status'], 0) + 1
+    print("{} plots compiled ({}), summary written to {}."
+          .format(len(statuses),
+                  ', '.join("{} {}".format(v, k)
+                            for k, v in sorted(counts.items())),
+                  summary_file))
+
+    if args.atlas is not None:
+        n_maps = write_atlas(statuses, args.atlas, args.atlas_columns)
+        print("{} plot maps written to the atlas {}."
+              .format(n_maps, args.atlas))
@@ -0,0 +1,303 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import os
+import sys
+import csv
+import json
+import math
+import random
+import sqlite3
+import tempfile
+import multiprocessing
+
+from easyplot_generator import SCHEMA, generate_references
+import ncpippn_compiler as compiler
+
+
+# Compile modes: (north_oriented, relative)
+MODES = {
+    'plot': (False, False),
+    'north': (True, False),
+    'relative': (True, True),
+}
+
+STAGES = ('check', 'references', 'load', 'dbh', 'positions', 'csv', 'png')
+
+# Number of rows inserted at a time when generating a synthetic database.
+INSERT_BATCH_SIZE = 10000
+
+
+def grid_xy(ref):
+    """
+    Plot oriented coordinates of a fixed reference, as computed by the
+    compiler (letters as ordinates).
+    """
+    return int(ref[1:]) * 10, (ord(ref[0]) - ord('A')) * 10
+
+
+def generate_synthetic_database(database_path, n_trees, chain_depth=3,
+                                tree_ref_ratio=0.3, max_stems=3, seed=0):
+    """
+    Generate an easyplot database with the schema of easyplot_generator,
+    filled with n_trees synthetic trees (with 1 to max_stems stems). The
+    fixed references are positioned from each other, A0 being the origin,
+    so the database can be compiled in relative mode. A tree_ref_ratio
+    share of the trees are positioned from another tree, making reference
+    chains of at most chain_depth trees.
+    """
+    rnd = random.Random(seed)
+    refs = generate_references()
+    quadrats = [r for r in refs if r[0] != 'K' and r[1:] != '0']
+    if os.path.exists(database_path):
+        os.remove(database_path)
+    connexion = sqlite3.connect(database_path)
+    cursor = connexion.cursor()
+    cursor.execute("PRAGMA journal_mode = OFF;")
+    cursor.execute("PRAGMA synchronous = OFF;")
+    cursor.executescript(SCHEMA)
+
+    # Fixed references, each one positioned from the previous one.
+    ref_rows = [(refs[0], None, None, None)]
+    for prev, ref in zip(refs, refs[1:]):
+        (x1, y1), (x2, y2) = grid_xy(prev), grid_xy(ref)
+        phi = math.degrees(math.atan2(y2 - y1, x2 - x1))
+        ref_rows.append((ref, prev, math.hypot(x2 - x1, y2 - y1),
+                         (90 - phi) % 360))
+    cursor.executemany(
+        "INSERT INTO ncpippn (id, reference, hdist, azimuth) "
+        "VALUES (?, ?, ?, ?);", ref_rows
+    )
+
+    def trees():
+        # Ids of the trees of each depth of the reference chains.
+        by_depth = [[] for _ in range(chain_depth)]
+        for i in range(1, n_trees + 1):
+            depth = 0
+            ref = rnd.choice(refs)
+            if chain_depth > 1 and rnd.random() < tree_ref_ratio:
+                depth = rnd.randint(1, chain_depth - 1)
+                while depth > 0 and not by_depth[depth - 1]:
+                    depth -= 1
+                if depth > 0:
+                    ref = rnd.choice(by_depth[depth - 1])
+            tree_id = str(i)
+            # Keep a bounded sample of the trees usable as references.
+            if len(by_depth[depth]) < 1000:
+                by_depth[depth].append(tree_id)
+            circs = ';'.join('{:.1f}'.format(rnd.uniform(10, 300))
+                             for _ in range(rnd.randint(1, max_stems)))
+            yield (tree_id, rnd.choice(quadrats), rnd.randint(0, 4), circs,
+                   rnd.uniform(2, 35), ref, rnd.uniform(0.5, 10),
+                   rnd.uniform(0, 360))
+
+    it = trees()
+    while True:
+        batch = [row for _, row in zip(range(INSERT_BATCH_SIZE), it)]
+        if not batch:
+            break
+        cursor.executemany(
+            "INSERT INTO ncpippn (id, quadrat, strata, circumferences, "
+            "height, reference, hdist, azimuth) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?);", batch
+        )
+    connexion.commit()
+    connexion.close()
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        return peak / (1024. * 1024)
+    return peak / 1024.
+
+
+def run_case(case):
+    """
+    Compile a database in the given mode with ncpippn_compiler.iter_compile,
+    timing each stage with a ncpippn_compiler.CompileProfile. Meant to run
+    in a fresh process, so the peak memory is the one of this case only.
+    """
+    database, n_trees, mode, png, chunk_size, work_dir = case
+    north_oriented, relative = MODES[mode]
+    plot_azimuth = 0
+    profile = compiler.CompileProfile()
+    h_refs, v_refs, refs = compiler.make_references(plot_azimuth,
+                                                    north_oriented, False)
+
+    chunks = compiler.iter_compile(database, plot_azimuth, north_oriented,
+                                   relative, False, True, chunk_size,
+                                   profile=profile)
+    if png:
+        plot_data = {'x': [], 'y': [], 'dbh': [],
+                     'xref_rel': [], 'yref_rel': []}
+        chunks = profile.timed(
+            compiler.iter_plot_data(chunks, refs, relative, plot_data), 'png'
+        )
+
+    output_csv_file = os.path.join(work_dir, '{}_{}.csv'.format(n_trees, mode))
+    with profile.stage('csv'):
+        with open(output_csv_file, 'w') as dest:
+            dest_writer = csv.writer(dest)
+            for d_rows in chunks:
+                dest_writer.writerows(d_rows)
+    os.remove(output_csv_file)
+
+    if png:
+        output_plot_png = os.path.join(work_dir,
+                                       '{}_{}.png'.format(n_trees, mode))
+        with profile.stage('png'):
+            compiler.save_plot_png(output_plot_png, h_refs, v_refs, refs,
+                                   False, relative, plot_data)
+        os.remove(output_plot_png)
+
+    report = profile.report()
+    seconds = dict((k, 0.) for k in STAGES)
+    for stage, s in report['stages'].items():
+        seconds[stage] = s['seconds']
+    total = report['total_seconds']
+    return {
+        'trees': n_trees,
+        'mode': mode,
+        'seconds': dict((k, round(v, 4)) for k, v in seconds.items()),
+        'total_seconds': round(total, 4),
+        'rows_per_second': int(n_trees / total) if total > 0 else None,
+        'peak_memory_mb': peak_memory_mb(),
+        'counters': report['counters'],
+    }
+
+
+def run_benchmark(sizes, modes, work_dir, chain_depth=3, tree_ref_ratio=0.3,
+                  max_stems=3, png=False, chunk_size=compiler.CHUNK_SIZE):
+    """
+    Generate a synthetic database of each size in work_dir (created if
+    needed) and compile it in each mode, each compilation running in a
+    fresh process. Return the list of the results (see run_case).
+    """
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    results = []
+    for n_trees in sizes:
+        database = os.path.join(work_dir, 'synthetic_{}.epdb'.format(n_trees))
+        generate_synthetic_database(database, n_trees, chain_depth,
+                                    tree_ref_ratio, max_stems)
+        cases = [(database, n_trees, mode, png, chunk_size, work_dir)
+                 for mode in modes]
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            for result in pool.imap(run_case, cases):
+                results.append(result)
+                print_result(result)
+        finally:
+            pool.close()
+            pool.join()
+        os.remove(database)
+    return results
+
+
+def print_result(result):
+    print("{:>10} {:<9} {}  total {:8.3f}s  {:>9} rows/s  peak {} MB".format(
+        result['trees'], result['mode'],
+        ' '.join("{} {:7.3f}s".format(k, result['seconds'][k])
+                 for k in STAGES),
+        result['total_seconds'], result['rows_per_second'],
+        None if result['peak_memory_mb'] is None
+        else int(result['peak_memory_mb'])
+    ))
+    sys.stdout.flush()
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+
+    def str2bool(v):
+        if v.lower() in ('yes', 'true', 't', 'y', '1'):
+            return True
+        if v.lower() in ('no', 'false', 'f', 'n', '0'):
+            return False
+        else:
+            raise argparse.ArgumentTypeError('Boolean value expected.')
+
+    description = \
+        """
+        NCPIPPN Benchmark generates synthetic easyplot databases and times
+        each stage of their compilation (load, dbh, positions, csv, png) in
+        the plot oriented, north oriented and relative modes.
+        """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[1000, 10000, 100000],
+        help="The numbers of trees of the synthetic databases"
+    )
+    parser.add_argument(
+        '--modes',
+        nargs='+',
+        choices=sorted(MODES.keys()),
+        default=['plot', 'north', 'relative'],
+        help="The compile modes to benchmark"
+    )
+    parser.add_argument(
+        '--chain_depth',
+        type=int,
+        default=3,
+        help="The maximum length of the tree to tree reference chains"
+    )
+    parser.add_argument(
+        '--tree_ref_ratio',
+        type=float,
+        default=0.3,
+        help="The share of trees positioned from another tree"
+    )
+    parser.add_argument(
+        '--max_stems',
+        type=int,
+        default=3,
+        help="The maximum number of stems of a tree"
+    )
+    parser.add_argument(
+        '--png',
+        type=str2bool,
+        default=False,
+        help="Also benchmark the png output (boolean: True/False)"
+    )
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=compiler.CHUNK_SIZE,
+        help="The number of rows read and compiled at a time"
+    )
+    parser.add_argument(
+        '--work_dir',
+        default=None,
+        help="The directory for the temporary files (default: a new "
+             "temporary directory)"
+    )
+    parser.add_argument(
+        '--output_json',
+        default=None,
+        help="If specified, the results are also written in this json file"
+    )
+
+    args = parser.parse_args()
+
+    work_dir = args.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix='ncpippn_benchmark_')
+
+    results = run_benchmark(args.sizes, args.modes, work_dir,
+                            args.chain_depth, args.tree_ref_ratio,
+                            args.max_stems, args.png, args.chunk_size)
+
+    if args.output_json is not None:
+        with open(args.output_json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
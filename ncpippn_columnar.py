@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# coding: utf-8
+
+"""
+Columnar binary format of the compiled tables of ncpippn_compiler, read
+back with memory mapping, without parsing nor copying.
+
+A file starts with MAGIC, the length of a json header (little endian
+uint64) and the header, listing the columns and the location of their
+arrays. Every array is stored contiguously, aligned on ALIGNMENT bytes:
+
+- numeric columns (strata, dbh, height, hdist, azimuth, x, y) as a single
+  array (int64 for strata, -1 when empty, float64 else, NaN when empty);
+- text columns (id, quadrat, circumferences, reference) as int32 codes
+  (-1 when empty) into a string table, itself stored as the utf-8 bytes of
+  its strings and an int64 offsets array;
+- the id column also has an int64 'order' array, the row positions sorted
+  by id, used as an index for looking rows up by id.
+"""
+
+import json
+import struct
+import bisect
+
+import numpy as np
+
+
+MAGIC = b'NCPCOL1\n'
+ALIGNMENT = 64
+
+STR_COLUMNS = ('id', 'quadrat', 'circumferences', 'reference')
+
+
+def string_table(values):
+    """
+    Dictionary encode a sequence of strings (or None). Return the int32
+    codes and the string table, as its utf-8 bytes and offsets.
+    """
+    codes = np.empty(len(values), dtype=np.int32)
+    table = {}
+    for i, v in enumerate(values):
+        if v is None:
+            codes[i] = -1
+        else:
+            codes[i] = table.setdefault(v, len(table))
+    encoded = [v.encode('utf-8') for v in sorted(table, key=table.get)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return codes, offsets, data
+
+
+def write_columnar(path, columns):
+    """
+    Write a compiled table, as a dict of columns (see
+    ncpippn_compiler.compile_columns), in the columnar format.
+    """
+    arrays = []
+    header = {'rows': len(columns['id']), 'columns': {}}
+    for name in columns:
+        if name in STR_COLUMNS:
+            codes, offsets, data = string_table(columns[name])
+            parts = {'codes': codes, 'offsets': offsets, 'data': data}
+            if name == 'id':
+                parts['order'] = np.argsort(
+                    np.asarray(columns[name], dtype=object), kind='mergesort'
+                ).astype(np.int64)
+        elif name == 'strata':
+            parts = {'values': np.asarray(columns[name], dtype=np.int64)}
+        else:
+            parts = {'values': np.asarray(columns[name], dtype=np.float64)}
+        header['columns'][name] = {}
+        for part, array in sorted(parts.items()):
+            array = np.ascontiguousarray(array)
+            # Stored little endian, whatever the platform.
+            array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+            header['columns'][name][part] = [array.dtype.str, len(array)]
+            arrays.append((name, part, array))
+
+    # The header size depends on the offsets: place the arrays again until
+    # it does not change.
+    head = b''
+    while True:
+        offset = len(MAGIC) + 8 + len(head)
+        for name, part, array in arrays:
+            offset += -offset % ALIGNMENT
+            header['columns'][name][part] = [array.dtype.str, len(array),
+                                             offset]
+            offset += array.nbytes
+        new_head = json.dumps(header, sort_keys=True).encode('utf-8')
+        if len(new_head) == len(head):
+            head = new_head
+            break
+        head = new_head
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(head)))
+        f.write(head)
+        for name, part, array in arrays:
+            f.write(b'\0' * (header['columns'][name][part][2] - f.tell()))
+            f.write(array.tobytes())
+
+
+class StringTable(object):
+    """
+    Read-only sequence of the strings of a string table.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes() \
+            .decode('utf-8')
+
+    def to_list(self):
+        """
+        Decode all the strings at once.
+        """
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[o0:o1].decode('utf-8')
+                for o0, o1 in zip(offsets, offsets[1:])]
+
+
+class SortedIds(object):
+    """
+    Read-only sequence of the ids of a table, sorted, for bisect.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table.order)
+
+    def __getitem__(self, i):
+        return self.table.ids[self.table.id_codes[self.table.order[i]]]
+
+
+class ColumnarTable(object):
+    """
+    A compiled table in the columnar format, memory mapped. The numeric
+    columns and the codes of the text columns are views of the mapped file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode='r')
+        if self.mm[:len(MAGIC)].tobytes() != MAGIC:
+            raise ValueError("{} is not a columnar file.".format(path))
+        start = len(MAGIC) + 8
+        size = struct.unpack('<Q', self.mm[len(MAGIC):start].tobytes())[0]
+        self.header = json.loads(
+            self.mm[start:start + size].tobytes().decode('utf-8')
+        )
+        self.columns = self.header['columns']
+        self.decoded = {}
+        if 'id' in self.columns:
+            self.id_codes = self.part('id', 'codes')
+            self.ids = self.strings('id')
+            self.order = self.part('id', 'order')
+
+    def __len__(self):
+        return self.header['rows']
+
+    def part(self, name, part):
+        dtype, count, offset = self.columns[name][part]
+        dtype = np.dtype(dtype)
+        return self.mm[offset:offset + count * dtype.itemsize].view(dtype)
+
+    def codes(self, name):
+        """
+        The int32 codes of a text column (-1 when empty), into
+        strings(name).
+        """
+        return self.part(name, 'codes')
+
+    def strings(self, name):
+        """
+        The string table of a text column.
+        """
+        return StringTable(self.part(name, 'offsets'),
+                           self.part(name, 'data'))
+
+    def __getitem__(self, name):
+        """
+        A column: a view of the mapped file for the numeric ones, a decoded
+        object array (None when empty) for the text ones.
+        """
+        if name not in STR_COLUMNS:
+            return self.part(name, 'values')
+        if name not in self.decoded:
+            table = self.strings(name)
+            values = np.empty(len(table) + 1, dtype=object)
+            values[:-1] = table.to_list()
+            # Code -1 picks the trailing None.
+            self.decoded[name] = values[self.codes(name)]
+        return self.decoded[name]
+
+    def row(self, tree_id):
+        """
+        The position of the row of an id, using the id index. Raise a
+        KeyError if the id is not in the table.
+        """
+        sorted_ids = SortedIds(self)
+        i = bisect.bisect_left(sorted_ids, tree_id)
+        if i == len(sorted_ids) or sorted_ids[i] != tree_id:
+            raise KeyError(tree_id)
+        return int(self.order[i])
+
+
+def read_columnar(path):
+    """
+    Open a file in the columnar format (see ColumnarTable).
+    """
+    return ColumnarTable(path)
@@ -1,12 +1,50 @@
 #!/usr/bin/python
 # coding: utf-8
 
+import os
 import math
 import csv
+import json
+import shutil
+import timeit
+import hashlib
 import sqlite3
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url
 
-import matplotlib.pyplot as plt
+import numpy as np
 
+import ncpippn_map
+import ncpippn_columnar
+import ncpippn_spatial
+
+
+# Number of rows read from the database at a time.
+CHUNK_SIZE = 10000
+
+# Renderers of the plot map: the built-in one, or matplotlib (optional).
+PLOT_BACKENDS = ('builtin', 'matplotlib')
+
+# Default size bound of the compile cache, in bytes.
+CACHE_SIZE = 512 * 1024 * 1024
+
+# Version of the compiled outputs, part of the compile cache keys: bump it
+# whenever the outputs of a same database and options change (e.g. the dbh
+# or the positions computed), so that older cache entries are not served.
+CACHE_VERSION = 1
+
+# Columns of the ncpippn table, which are also those of the compiled table.
+COLUMNS = ('id', 'quadrat', 'strata', 'circumferences', 'dbh', 'height',
+           'reference', 'hdist', 'azimuth', 'x', 'y')
+STR_COLUMNS = ('id', 'quadrat', 'circumferences', 'reference')
+
+# Id of the origin reference, the first row of an easyplot database.
+ORIGIN_ID = 'A0'
 
 # IDX
 ID_IDX = 0
@@ -20,6 +58,95 @@ X_IDX = 9
 Y_IDX = 10
 
 
+class CompileProfile(object):
+    """
+    Wall time and call counts of the compilation stages, and counters.
+    The time of a stage excludes the time of the stages nested in it (for
+    instance, the time of the dbh stage excludes the time spent reading
+    the rows it receives).
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._nested = 0.
+
+    def add_time(self, stage, seconds, calls=1):
+        s = self.stages.setdefault(stage, {'seconds': 0., 'calls': 0})
+        s['seconds'] += seconds
+        s['calls'] += calls
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def set_max(self, counter, value):
+        self.counters[counter] = max(self.counters.get(counter, 0), value)
+
+    @contextmanager
+    def stage(self, stage):
+        outer_nested = self._nested
+        self._nested = 0.
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            elapsed = timeit.default_timer() - start
+            self.add_time(stage, elapsed - self._nested)
+            self._nested = outer_nested + elapsed
+
+    def timed(self, chunks, stage):
+        """
+        Yield the chunks, timing the stage producing them.
+        """
+        it = iter(chunks)
+        while True:
+            outer_nested = self._nested
+            self._nested = 0.
+            start = timeit.default_timer()
+            try:
+                chunk = next(it)
+            except StopIteration:
+                chunk = None
+            elapsed = timeit.default_timer() - start
+            self.add_time(stage, elapsed - self._nested,
+                          0 if chunk is None else 1)
+            self._nested = outer_nested + elapsed
+            if chunk is None:
+                return
+            yield chunk
+
+    def report(self):
+        total = sum(s['seconds'] for s in self.stages.values())
+        rows = self.counters.get('rows_compiled', 0)
+        return {
+            'total_seconds': total,
+            'rows_per_second': rows / total if total > 0 else None,
+            'stages': self.stages,
+            'counters': self.counters,
+        }
+
+
+@contextmanager
+def profile_stage(profile, stage):
+    """
+    Time the enclosed block as a stage of profile, if it is not None.
+    """
+    if profile is None:
+        yield
+    else:
+        with profile.stage(stage):
+            yield
+
+
+def profiled(chunks, profile, stage):
+    """
+    Time the stage producing the chunks, if profile is not None.
+    """
+    if profile is None:
+        return chunks
+    return profile.timed(chunks, stage)
+
+
 def easyplot_db_to_data_array(database_path):
     c = sqlite3.connect(database_path)
     cur = c.cursor()
@@ -29,14 +156,105 @@ def easyplot_db_to_data_array(database_path):
     return data
 
 
-def get_row_from_easyplot_db(database_path, row_id):
+def iter_easyplot_db(database_path, chunk_size=CHUNK_SIZE,
+                     columns='*'):
+    """
+    Iterate over the rows of an easyplot database by chunks of at most
+    chunk_size rows, so the whole table is never held in memory.
+    """
+    c = sqlite3.connect(database_path)
+    try:
+        cur = c.cursor()
+        cur.execute("SELECT {} FROM ncpippn;".format(columns))
+        while True:
+            chunk = cur.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        c.close()
+
+
+def connect_read_only(database_path):
+    """
+    Open a read-only connection to an easyplot database.
+    """
+    uri = 'file:{}?mode=ro'.format(
+        pathname2url(os.path.abspath(database_path))
+    )
+    return sqlite3.connect(uri, uri=True)
+
+
+def iter_easyplot_db_shard(database_path, first_rowid, last_rowid,
+                           chunk_size=CHUNK_SIZE, columns='*'):
+    """
+    Iterate over the rows of an easyplot database whose rowid is in
+    [first_rowid, last_rowid], in the table order, by chunks of at most
+    chunk_size rows, through a read-only connection.
+    """
+    c = connect_read_only(database_path)
+    try:
+        cur = c.cursor()
+        cur.execute("SELECT {} FROM ncpippn WHERE rowid BETWEEN ? AND ? "
+                    "ORDER BY rowid;".format(columns),
+                    (first_rowid, last_rowid))
+        while True:
+            chunk = cur.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        c.close()
+
+
+def shard_ranges(database_path, shards):
+    """
+    Split the rows of an easyplot database into at most shards contiguous
+    rowid ranges of about the same number of rows. Return the list of
+    (first_rowid, last_rowid) ranges, in the table order.
+    """
+    c = connect_read_only(database_path)
+    try:
+        cur = c.cursor()
+        count, last = cur.execute(
+            "SELECT count(*), max(rowid) FROM ncpippn;"
+        ).fetchone()
+        if not count:
+            return []
+        shards = max(1, min(shards, count))
+        firsts = []
+        for k in range(shards):
+            firsts.append(cur.execute(
+                "SELECT rowid FROM ncpippn ORDER BY rowid LIMIT 1 OFFSET ?;",
+                (k * count // shards,)
+            ).fetchone()[0])
+    finally:
+        c.close()
+    return [(first, next_first - 1) for first, next_first
+            in zip(firsts, firsts[1:])] + [(firsts[-1], last)]
+
+
+def easyplot_db_to_reference_index(database_path):
+    """
+    Return an id-keyed index of the rows used as a reference by other rows.
+    Since the reference of a reference is itself a reference, this is
+    enough to resolve any reference chain.
+    """
     c = sqlite3.connect(database_path)
     cur = c.cursor()
-    cur.execute("SELECT * FROM ncpippn WHERE ncpippn.id = '{}';"
-                .format(row_id))
-    data = cur.fetchone()
+    cur.execute("SELECT * FROM ncpippn WHERE id IN "
+                "(SELECT reference FROM ncpippn);")
+    index = data_array_to_index(cur.fetchall())
     c.close()
-    return data
+    return index
+
+
+def data_array_to_index(data):
+    """
+    Build an id-keyed index of the rows of an easyplot database, so
+    references can be looked up without querying the database again.
+    """
+    return dict((row[ID_IDX], row) for row in data)
 
 
 def stem_circ_to_dbh(*stems):
@@ -52,6 +270,76 @@ def stem_circ_to_dbh(*stems):
     return 2 * math.sqrt(total_area / math.pi)
 
 
+def parse_stems(circumferences):
+    """
+    Parse a ';' separated circumferences value into a list of floats.
+    Raise a ValueError describing the problem if the value is malformed.
+    """
+    stems = []
+    for stem in circumferences.split(';'):
+        if not stem.strip():
+            raise ValueError("empty stem in '{}'".format(circumferences))
+        if ',' in stem:
+            raise ValueError("comma decimal separator in '{}'"
+                             .format(circumferences))
+        try:
+            stems.append(float(stem))
+        except ValueError:
+            raise ValueError("invalid stem value '{}' in '{}'"
+                             .format(stem, circumferences))
+    return stems
+
+
+def parse_circumferences(column):
+    """
+    Parse a whole circumferences column into a flat float array of stem
+    circumferences plus an offsets array, the stems of row i being
+    circs[offsets[i]:offsets[i + 1]]. Rows without circumferences have no
+    stems. Malformed rows are given no stems and are reported in the
+    returned errors list, as (row position, message) tuples.
+    """
+    counts = np.zeros(len(column), dtype=np.int64)
+    values = []
+    for i, circumferences in enumerate(column):
+        if circumferences:
+            counts[i] = circumferences.count(';') + 1
+            values.append(circumferences)
+    errors = []
+    try:
+        circs = np.array(';'.join(values).split(';') if values else [],
+                         dtype=float)
+    except ValueError:
+        # Parse row by row to report every malformed row.
+        circs = []
+        for i, circumferences in enumerate(column):
+            if not circumferences:
+                continue
+            try:
+                circs.extend(parse_stems(circumferences))
+            except ValueError as e:
+                counts[i] = 0
+                errors.append((i, str(e)))
+        circs = np.array(circs, dtype=float)
+    offsets = np.zeros(len(column) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return circs, offsets, errors
+
+
+def stem_circ_to_dbh_array(circs, offsets):
+    """
+    Array version of stem_circ_to_dbh: given the flat stem circumferences
+    array and the offsets returned by parse_circumferences, compute the
+    equivalent dbh of every row with a segmented sum of the stem areas.
+    Rows without stems get a 0 dbh.
+    """
+    counts = np.diff(offsets)
+    rows = np.repeat(np.arange(len(counts)), counts)
+    r = circs / (2 * math.pi)
+    a = math.pi * r**2
+    total_area = np.bincount(rows, weights=a, minlength=len(counts))
+    return 2 * np.sqrt(total_area / math.pi)
+
+
 def azimuth_to_trigo(azimuth, plot_azimuth):
     """
     Convert an azimuth in degrees to a radian trigonometric angle.
@@ -60,63 +348,583 @@ def azimuth_to_trigo(azimuth, plot_azimuth):
     return math.radians(h) if h < 180 else math.radians(h - 360)
 
 
-def resolve_ref(ref, refs, input_database, plot_azimuth, north_oriented):
-    if ref in refs:
-        return refs[ref]
+def azimuth_to_trigo_array(azimuth, plot_azimuth):
+    """
+    Array version of azimuth_to_trigo: convert azimuths in degrees to
+    radian trigonometric angles.
+    """
+    h = 450 - np.asarray(azimuth, dtype=float) + plot_azimuth
+    return np.radians(np.where(h < 180, h, h - 360))
+
+
+def get_xy_array(ref_x, ref_y, dbh, hdist, azimuth, plot_azimuth,
+                 north_oriented):
+    """
+    Compute the carthesian coordinates of a batch of trees given the
+    coordinates of their (already resolved) references, their horizontal
+    distances to the references, their azimuths and their dbh. Return the x
+    and y arrays.
+    """
+    # Rectified hdist with half the dbh of the trees.
+    hdist_rect = np.asarray(hdist, dtype=float) \
+        + 0.5 * np.asarray(dbh, dtype=float)
+    az = plot_azimuth if not north_oriented else 0
+    phi = azimuth_to_trigo_array(azimuth, az)
+    x = np.asarray(ref_x, dtype=float) + np.cos(phi) * hdist_rect
+    y = np.asarray(ref_y, dtype=float) + np.sin(phi) * hdist_rect
+    return x, y
+
+
+def bound_0_100(v):
+    """
+    Set a coordinate below 0 to 0 and above 100 to 100 (written as the
+    integers 0 and 100 in the csv, as they always were).
+    """
+    if v > 100:
+        return 100
+    if v < 0:
+        return 0
+    return v
+
+
+def format_circumferences_errors(errors):
+    """
+    Format a list of (id, message) circumferences errors.
+    """
+    return "Invalid circumferences:\n{}".format('\n'.join(
+        "  id '{}': {}".format(row_id, e) for row_id, e in errors
+    ))
+
+
+def check_circumferences(database_path, chunk_size=CHUNK_SIZE):
+    """
+    Parse the circumferences column of an easyplot database by chunks and
+    raise a ValueError listing every malformed row, if any.
+    """
+    errors = []
+    for rows in iter_easyplot_db(database_path, chunk_size,
+                                 'id, circumferences'):
+        chunk_errors = parse_circumferences([row[1] for row in rows])[2]
+        errors.extend((rows[i][0], e) for i, e in chunk_errors)
+    if errors:
+        raise ValueError(format_circumferences_errors(errors))
+
+
+def iter_rows_to_compile(chunks, refs, relative, skip_first=True):
+    """
+    Filter the chunks of database rows, leaving out the first row (the
+    origin, unless skip_first is False) and, unless in relative mode, the
+    fixed references.
+    """
+    first = skip_first
+    for rows in chunks:
+        if first:
+            rows = rows[1:]
+            first = False
+        if not relative:
+            rows = [row for row in rows if row[ID_IDX] not in refs]
+        if rows:
+            yield rows
+
+
+def rows_dbh(rows):
+    """
+    Compute the dbh (in cm, rounded to 1 decimal) of a list of rows from
+    their circumferences. Return the dbh list and a list telling whether
+    each row has circumferences data.
+    """
+    circs, offsets, errors = parse_circumferences(
+        [row[CIRCS_IDX] for row in rows]
+    )
+    if errors:
+        raise ValueError(format_circumferences_errors(
+            [(rows[i][ID_IDX], e) for i, e in errors]
+        ))
+    dbhs = np.round(stem_circ_to_dbh_array(circs, offsets), 1).tolist()
+    has_circs = (np.diff(offsets) > 0).tolist()
+    return dbhs, has_circs
+
+
+def iter_dbh(chunks):
+    """
+    Compute the dbh of the chunks of rows. Yield (rows, dbhs, has_circs)
+    tuples, has_circs telling whether a row has circumferences data.
+    """
+    for rows in chunks:
+        dbhs, has_circs = rows_dbh(rows)
+        yield rows, dbhs, has_circs
+
+
+def reference_dbhs(index):
+    """
+    Return the dbh (in meters) used to position each tree of the reference
+    index: the dbh computed from its circumferences (15 cm when there are
+    none), as for any compiled row.
+    """
+    ids = list(index.keys())
+    dbhs, has_circs = rows_dbh([index[i] for i in ids])
+    return dict((i, (dbh if has else 15) * 0.01)
+                for i, dbh, has in zip(ids, dbhs, has_circs))
+
+
+def find_reference_cycle(ref_id, index):
+    """
+    Return the reference cycle reached from ref_id, as a list of ids, or
+    None if its reference chain does not loop.
+    """
+    chain = []
+    seen = set()
+    while ref_id in index and ref_id not in seen:
+        chain.append(ref_id)
+        seen.add(ref_id)
+        ref_id = index[ref_id][REF_IDX]
+    if ref_id in seen:
+        return chain[chain.index(ref_id):] + [ref_id]
+    return None
+
+
+def resolve_reference_graph(index, refs, dbhs, plot_azimuth,
+                            north_oriented, profile=None):
+    """
+    Position the trees of the reference index (the rows used as references)
+    by evaluating the reference graph level by level, in topological order:
+    the first level is made of the trees referencing a fixed reference of
+    refs, the next one of the trees referencing a tree of the first level,
+    and so on. Each level is computed in one vectorized batch. dbhs maps
+    each id of the index to the dbh (in meters) used to position it.
+
+    Return a (resolved, unresolved) tuple: resolved maps the id of each
+    positioned tree to its coordinates, unresolved maps the id of each tree
+    that can not be positioned (missing or unpositioned reference, reference
+    cycle) to the reason why. If profile is given, the depth of the
+    reference chains and the number of lookups are counted in it.
+    """
+    resolved = {}
+    unresolved = {}
+    children = {}
+    level = []
+    depth = 0
+    for row_id, row in index.items():
+        if row_id in refs:
+            continue
+        ref = row[REF_IDX]
+        if not ref:
+            unresolved[row_id] = \
+                "The reference '{}' had not been positioned.".format(row_id)
+        elif ref in refs:
+            level.append(row_id)
+        elif ref in index:
+            children.setdefault(ref, []).append(row_id)
+        else:
+            unresolved[row_id] = \
+                "The reference '{}' does not exist in database.".format(ref)
+    while level:
+        ref_x, ref_y = zip(*[resolved[index[i][REF_IDX]]
+                             if index[i][REF_IDX] in resolved
+                             else refs[index[i][REF_IDX]] for i in level])
+        x, y = get_xy_array(ref_x, ref_y,
+                            [dbhs[i] for i in level],
+                            [index[i][HDIST_IDX] for i in level],
+                            [index[i][AZIMUTH_IDX] for i in level],
+                            plot_azimuth, north_oriented)
+        resolved.update(zip(level, zip(x.tolist(), y.tolist())))
+        if profile is not None:
+            profile.count('reference_lookups', len(level))
+        depth += 1
+        level = [c for i in level for c in children.get(i, [])]
+    # The trees left either depend on an unresolved tree or are in a cycle.
+    for row_id in index:
+        if row_id in refs or row_id in resolved or row_id in unresolved:
+            continue
+        cycle = find_reference_cycle(row_id, index)
+        if cycle is not None:
+            message = "The reference '{}' is part of a reference cycle: {}." \
+                .format(cycle[0], ' -> '.join(cycle))
+            for i in cycle:
+                unresolved[i] = message
+        chain = [row_id]
+        while chain[-1] not in unresolved:
+            chain.append(index[chain[-1]][REF_IDX])
+        for i in chain:
+            unresolved[i] = unresolved[chain[-1]]
+    if profile is not None:
+        profile.set_max('reference_chain_depth', depth)
+        profile.count('unresolved_references', len(unresolved))
+    return resolved, unresolved
+
+
+def lookup_ref(ref, positions, unresolved):
+    """
+    Return the coordinates of a reference, or raise a ValueError telling
+    why it could not be positioned.
+    """
+    try:
+        return positions[ref]
+    except KeyError:
+        raise ValueError(unresolved.get(
+            ref, "The reference '{}' does not exist in database.".format(ref)
+        ))
+
+
+def position_rows(rows, dbhs, has_circs, positions, unresolved,
+                  plot_azimuth, north_oriented, relative, force_0_100_bounds):
+    """
+    Compute the positions of a list of rows, given their dbh, in one batch,
+    and return the compiled rows. positions maps every reference (fixed or
+    tree) to its coordinates, and unresolved the references that could not
+    be positioned to the reason why.
+    """
+    d_rows = []
+    batch_rows = []
+    batch_ref_xy = []
+    batch_dbh = []
+    batch_hdist = []
+    batch_azimuth = []
+    for row, row_dbh, row_has_circs in zip(rows, dbhs, has_circs):
+        d_row = [val for val in row]
+        dbh = 15
+        if row_has_circs:
+            dbh = row_dbh
+            d_row[DBH_IDX] = dbh
+        if row[REF_IDX]:
+            batch_ref_xy.append(lookup_ref(row[REF_IDX], positions,
+                                           unresolved))
+            batch_rows.append(d_row)
+            batch_dbh.append(dbh)
+            batch_hdist.append(float(d_row[HDIST_IDX]))
+            batch_azimuth.append(float(d_row[AZIMUTH_IDX]))
+        d_rows.append(d_row)
+    if batch_rows:
+        ref_x, ref_y = zip(*batch_ref_xy)
+        x, y = get_xy_array(ref_x, ref_y, np.array(batch_dbh) * 0.01,
+                            batch_hdist, batch_azimuth, plot_azimuth,
+                            north_oriented)
+        x, y = x.tolist(), y.tolist()
+        if force_0_100_bounds and not relative:
+            x = [bound_0_100(xi) for xi in x]
+            y = [bound_0_100(yi) for yi in y]
+        for d_row, xi, yi in zip(batch_rows, x, y):
+            d_row[X_IDX] = xi
+            d_row[Y_IDX] = yi
+    return d_rows
+
+
+def iter_positions(chunks, positions, unresolved, plot_azimuth,
+                   north_oriented, relative, force_0_100_bounds):
+    """
+    Compute the positions of the chunks of (rows, dbhs, has_circs) in one
+    batch per chunk (see position_rows), and yield the compiled rows.
+    """
+    for rows, dbhs, has_circs in chunks:
+        yield position_rows(rows, dbhs, has_circs, positions, unresolved,
+                            plot_azimuth, north_oriented, relative,
+                            force_0_100_bounds)
+
+
+# Tables of the state database of an incremental compilation: the compile
+# options and CACHE_VERSION the state was made with, and for each compiled
+# row, keyed on its rowid in the database, the inputs its dbh and position
+# depend on (STATE_INPUTS), its compiled dbh, x and y, and its position as
+# a reference (px, py, not bounded). The values are stored without type
+# affinity, so they compare equal to the database values, and the bounded
+# coordinates stay the integers 0 and 100 (see bound_0_100).
+STATE_INPUTS = ('circumferences', 'reference', 'hdist', 'azimuth')
+
+STATE_SCHEMA = \
+    """
+    DROP TABLE IF EXISTS compiled;
+    DROP TABLE IF EXISTS compiled_rows;
+    CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS rows (
+        rid INTEGER PRIMARY KEY, id TEXT UNIQUE, circumferences, reference,
+        hdist, azimuth, dbh, x, y, px, py
+    );
+    CREATE INDEX IF NOT EXISTS rows_reference ON rows (reference);
+    """
+
+# The rows to compile (see iter_rows_to_compile) whose inputs changed since
+# the state was made, the rows of the state removed or not compiled since,
+# and the rows of the state positioned from any of them, recursively.
+DIRTY_QUERY = \
+    """
+    WITH RECURSIVE dirty(id) AS (
+        SELECT n.id FROM input.ncpippn n LEFT JOIN rows s ON s.rid = n.rowid
+        WHERE {compiled} AND (s.rid IS NULL OR n.id IS NOT s.id OR {changed})
+        UNION
+        SELECT s.id FROM rows s LEFT JOIN input.ncpippn n ON n.rowid = s.rid
+        WHERE n.rowid IS NULL OR n.id IS NOT s.id OR NOT ({compiled})
+        UNION
+        SELECT s.id FROM rows s JOIN dirty d ON s.reference = d.id
+    )
+    INSERT INTO temp.dirty SELECT id FROM dirty;
+    """
+
+
+def has_data(column):
+    return "({0} IS NOT NULL AND {0} != '')".format(column)
+
+
+def compiled_rows_filter(first_rowid, refs, relative):
+    """
+    The SQL condition (on the input.ncpippn n rows) and parameters of the
+    rows to compile: same as iter_rows_to_compile.
+    """
+    sql = "n.rowid > ?"
+    parameters = [first_rowid]
+    if not relative:
+        sql += " AND n.id NOT IN ({})".format(', '.join('?' * len(refs)))
+        parameters.extend(sorted(refs))
+    return sql, parameters
+
+
+def iter_incremental_compile(input_database, state_file, refs, options_key,
+                             plot_azimuth, north_oriented, relative,
+                             force_0_100_bounds, chunk_size=CHUNK_SIZE,
+                             profile=None):
+    """
+    Incremental version of the check, references, dbh and positions stages
+    of iter_compile. The rows to recompute (see DIRTY_QUERY) are found by
+    comparing the database with the state of the previous compilation in
+    state_file, inside SQLite, and only their circumferences are checked
+    and only the trees they reference are positioned. The other rows are
+    read with their dbh and position from the state, without any
+    computation. The state is made from scratch when missing, or made with
+    other options or by another version of the compiler, and updated in
+    one transaction once every row is compiled. If profile is given, the
+    reused and recomputed rows are counted in it.
+    """
+    # Opened as an URI, so the input database can be attached read-only.
+    connection = sqlite3.connect(
+        'file:{}'.format(pathname2url(os.path.abspath(state_file))),
+        uri=True, isolation_level=None
+    )
     try:
-        row = get_row_from_easyplot_db(input_database, ref)
-    except:
-        raise ValueError(
-            "The reference '{}' does not exist in database.".format(ref)
+        cur = connection.cursor()
+        cur.executescript(STATE_SCHEMA)
+        cur.execute("ATTACH DATABASE ? AS input;", ('file:{}?mode=ro'.format(
+            pathname2url(os.path.abspath(input_database))
+        ),))
+        meta = {'version': str(CACHE_VERSION), 'options': repr(options_key)}
+        full = dict(cur.execute("SELECT key, value FROM state;")) != meta
+        cur.execute("BEGIN;")
+        first_rowid = cur.execute(
+            "SELECT min(rowid) FROM input.ncpippn;"
+        ).fetchone()[0]
+        compiled, parameters = compiled_rows_filter(first_rowid, refs,
+                                                    relative)
+        fixed_refs = {ORIGIN_ID: (0, 0)} if relative else refs
+        dirty = None
+        if full:
+            cur.execute("DELETE FROM rows;")
+            with profile_stage(profile, 'check'):
+                check_circumferences(input_database, chunk_size)
+            with profile_stage(profile, 'references'):
+                positions, unresolved = resolve_positions(
+                    input_database, refs, plot_azimuth, north_oriented,
+                    relative, profile
+                )
+        else:
+            with profile_stage(profile, 'references'):
+                cur.execute("CREATE TEMP TABLE dirty (id TEXT PRIMARY KEY);")
+                cur.execute(DIRTY_QUERY.format(
+                    compiled=compiled,
+                    changed=' OR '.join('n.{0} IS NOT s.{0}'.format(c)
+                                        for c in STATE_INPUTS)
+                ), parameters * 2)
+                index = data_array_to_index(cur.execute(
+                    "SELECT n.* FROM input.ncpippn n "
+                    "JOIN temp.dirty d ON d.id = n.id;"
+                ).fetchall())
+            with profile_stage(profile, 'check'):
+                # The rows which are not compiled are checked too, as by
+                # a full compilation.
+                register_sql_functions(connection)
+                errors = cur.execute(
+                    "SELECT id, error FROM (SELECT n.rowid AS r, n.id, "
+                    "circumferences_error(n.circumferences) AS error "
+                    "FROM input.ncpippn n WHERE n.id IN (SELECT id FROM "
+                    "temp.dirty) OR NOT ({})) WHERE error IS NOT NULL "
+                    "ORDER BY r;".format(compiled), parameters
+                ).fetchall()
+                if errors:
+                    raise ValueError(format_circumferences_errors(errors))
+            with profile_stage(profile, 'references'):
+                dirty = set(index)
+                # The positions of the clean trees referenced by dirty ones.
+                positions = dict(fixed_refs)
+                unresolved = {}
+                for row_id, px, py in cur.execute(
+                        "SELECT s.id, s.px, s.py FROM rows s "
+                        "WHERE s.id IN (SELECT n.reference FROM "
+                        "input.ncpippn n JOIN temp.dirty d ON d.id = n.id) "
+                        "AND s.id NOT IN (SELECT id FROM temp.dirty);"):
+                    if px is None:
+                        unresolved[row_id] = "The reference '{}' had not " \
+                                             "been positioned.".format(row_id)
+                    else:
+                        positions[row_id] = (px, py)
+                resolved, index_unresolved = resolve_reference_graph(
+                    index, positions, reference_dbhs(index), plot_azimuth,
+                    north_oriented, profile
+                )
+                positions.update(resolved)
+                unresolved.update(index_unresolved)
+
+        # The clean rows are read with their dbh and position from the
+        # state, as compiled (see position_rows).
+        joins = ''
+        clean = ''
+        if not full:
+            joins = "LEFT JOIN rows s ON s.rid = n.rowid"
+        if dirty:
+            joins = "LEFT JOIN temp.dirty d ON d.id = n.id " + joins
+            clean = "d.id IS NULL AND "
+        select = []
+        for c in COLUMNS:
+            if c == 'dbh' and not full:
+                c = "CASE WHEN {}{} THEN s.dbh ELSE n.dbh END".format(
+                    clean, has_data('n.circumferences'))
+            elif c in ('x', 'y') and not full:
+                c = "CASE WHEN {}{} THEN s.{} ELSE n.{} END".format(
+                    clean, has_data('n.reference'), c, c)
+            else:
+                c = 'n.' + c
+            select.append(c)
+        read = connection.cursor()
+        read.execute(
+            "SELECT {} FROM input.ncpippn n {} WHERE {} ORDER BY n.rowid;"
+            .format(', '.join(select), joins, compiled),
+            parameters
         )
-    ref_ref = row[REF_IDX]
-    if ref_ref is None:
-        raise ValueError(
-            "The reference '{}' had not been positioned.".format(ref)
+        bound = force_0_100_bounds and not relative
+        # The state rows being read, the recomputed ones are staged aside.
+        cur.execute("CREATE TEMP TABLE computed (id TEXT PRIMARY KEY, dbh, "
+                    "x, y, px, py);")
+        chunks = profiled(iter(lambda: read.fetchmany(chunk_size), []),
+                          profile, 'load')
+        for rows in chunks:
+            if full:
+                changed = list(range(len(rows)))
+            elif dirty:
+                changed = [i for i, row in enumerate(rows)
+                           if row[ID_IDX] in dirty]
+            else:
+                changed = []
+            if profile is not None:
+                profile.count('rows_reused', len(rows) - len(changed))
+                profile.count('rows_recomputed', len(changed))
+            if not changed:
+                yield rows
+                continue
+            with profile_stage(profile, 'incremental'):
+                changed_rows = [rows[i] for i in changed]
+                dbhs, has_circs = rows_dbh(changed_rows)
+                computed = position_rows(changed_rows, dbhs, has_circs,
+                                         positions, unresolved, plot_azimuth,
+                                         north_oriented, relative, False)
+                state_rows = []
+                for d_row in computed:
+                    px = py = None
+                    if d_row[REF_IDX]:
+                        px, py = d_row[X_IDX], d_row[Y_IDX]
+                        if bound:
+                            d_row[X_IDX] = bound_0_100(px)
+                            d_row[Y_IDX] = bound_0_100(py)
+                    state_rows.append((d_row[ID_IDX], d_row[DBH_IDX],
+                                       d_row[X_IDX], d_row[Y_IDX], px, py))
+                cur.executemany("INSERT INTO temp.computed VALUES (?, ?, ?, "
+                                "?, ?, ?);", state_rows)
+                rows = list(rows)
+                for i, d_row in zip(changed, computed):
+                    rows[i] = d_row
+            yield rows
+        if dirty:
+            cur.execute("DELETE FROM rows WHERE id IN (SELECT id FROM "
+                        "temp.dirty);")
+        cur.execute(
+            "INSERT INTO rows SELECT n.rowid, n.id, {}, c.dbh, c.x, c.y, "
+            "c.px, c.py FROM temp.computed c JOIN input.ncpippn n "
+            "ON n.id = c.id;".format(', '.join('n.' + c
+                                               for c in STATE_INPUTS))
         )
-    ref_hdist = row[HDIST_IDX]
-    ref_dbh = row[DBH_IDX]
-    if ref_dbh is None:
-        ref_dbh = 0
-    ref_azimuth = row[AZIMUTH_IDX]
-    return get_xy(ref_ref, ref_dbh, ref_hdist, ref_azimuth, refs,
-                  plot_azimuth, north_oriented, input_database)
-
-
-def get_xy(ref, dbh, hdist, azimuth, refs, plot_azimuth, north_oriented,
-           input_database, force_0_100_bounds=False):
-    """
-    Compute and return the carthesian coordinates of a tree given
-    a reference point, the horizontal distance between the reference
-    and the tree, the azimuth of the direction from the reference
-    to the tree, and the dbh of the tree.
-    """
-    ref_x, ref_y = resolve_ref(ref, refs, input_database, plot_azimuth,
-                               north_oriented)
-    # Rectified hdist with half the dbh of the tree.
-    hdist_rect = hdist + 0.5 * dbh
-    az = plot_azimuth if not north_oriented else 0
-    phi = azimuth_to_trigo(azimuth, az)
-    dx = math.cos(phi) * hdist_rect
-    dy = math.sin(phi) * hdist_rect
-    x, y = ref_x + dx, ref_y + dy
-    if force_0_100_bounds:
-        if x > 100:
-            x = 100
-        if x < 0:
-            x = 0
-        if y > 100:
-            y = 100
-        if y < 0:
-            y = 0
-    return x, y
+        cur.execute("DELETE FROM state;")
+        cur.executemany("INSERT INTO state (key, value) VALUES (?, ?);",
+                        sorted(meta.items()))
+        cur.execute("COMMIT;")
+    finally:
+        connection.close()
 
 
-def compile_data(input_database, output_csv_file, csv_delimiter, plot_azimuth,
-                 output_plot_png, north_oriented, relative,
-                 letters_abscissa, force_0_100_bounds):
+def iter_plot_data(chunks, refs, relative, plot_data):
+    """
+    Append the dbh and positions needed for plotting the chunks of compiled
+    rows to the lists of plot_data, and yield the chunks unchanged.
+    """
+    for d_rows in chunks:
+        for d_row in d_rows:
+            if not d_row[REF_IDX]:
+                continue
+            x, y = d_row[X_IDX], d_row[Y_IDX]
+            plot_data['dbh'].append(d_row[DBH_IDX] if d_row[CIRCS_IDX]
+                                    else 15)
+            plot_data['x'].append(x)
+            plot_data['y'].append(y)
+            if relative and d_row[ID_IDX] in refs:
+                plot_data['xref_rel'].append(x)
+                plot_data['yref_rel'].append(y)
+        yield d_rows
+
+
+def iter_write_back(chunks, connection):
+    """
+    Stage the dbh and positions of the chunks of compiled rows in a
+    temporary table of the connection, and yield the chunks unchanged.
+    The staged values are written in the ncpippn table by write_back, once
+    the database is no longer being read.
+    """
+    cur = connection.cursor()
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS compiled "
+                "(id TEXT PRIMARY KEY, dbh REAL, x REAL, y REAL);")
+    cur.execute("DELETE FROM temp.compiled;")
+    for d_rows in chunks:
+        cur.executemany(
+            "INSERT INTO temp.compiled (id, dbh, x, y) VALUES (?, ?, ?, ?);",
+            [(r[ID_IDX], r[DBH_IDX], r[X_IDX], r[Y_IDX]) for r in d_rows]
+        )
+        yield d_rows
+
 
-    # Generate references
+def write_back(connection, parameters):
+    """
+    Write the dbh and positions staged by iter_write_back in the ncpippn
+    table, and the compile parameters in the compilation table, in one
+    transaction.
+    """
+    cur = connection.cursor()
+    cur.execute(
+        """
+        UPDATE ncpippn SET
+            dbh = (SELECT dbh FROM temp.compiled c WHERE c.id = ncpippn.id),
+            x = (SELECT x FROM temp.compiled c WHERE c.id = ncpippn.id),
+            y = (SELECT y FROM temp.compiled c WHERE c.id = ncpippn.id)
+        WHERE id IN (SELECT id FROM temp.compiled);
+        """)
+    cur.execute("CREATE TABLE IF NOT EXISTS compilation "
+                "(parameter TEXT PRIMARY KEY, value TEXT);")
+    cur.execute("DELETE FROM compilation;")
+    cur.executemany(
+        "INSERT INTO compilation (parameter, value) VALUES (?, ?);",
+        sorted((k, str(v)) for k, v in parameters.items())
+    )
+    cur.execute("DROP TABLE temp.compiled;")
+    connection.commit()
+
+
+def make_references(plot_azimuth, north_oriented, letters_abscissa):
+    """
+    Return the h_refs and v_refs labels of the plot grid, and a dict giving
+    the coordinates of each of the 121 fixed references.
+    """
     if letters_abscissa:
         h_refs = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K']
         v_refs = [str(i) for i in range(11)]
@@ -124,14 +932,6 @@ def compile_data(input_database, output_csv_file, csv_delimiter, plot_azimuth,
         v_refs = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K']
         h_refs = [str(i) for i in range(11)]
     refs = {}
-    rel_refs = {'A0': (0, 0)}
-    lxref = []
-    lyref = []
-    lxref_rel = []
-    lyref_rel = []
-    ldbh = []
-    lx = []
-    ly = []
 
     theta = math.radians(360 - plot_azimuth)
 
@@ -150,73 +950,680 @@ def compile_data(input_database, output_csv_file, csv_delimiter, plot_azimuth,
             y2 = x1 * math.sin(theta) + y1 * math.cos(theta)
             if north_oriented:
                 refs[r] = (x2, y2)
-                lxref.append(x2)
-                lyref.append(y2)
             else:
                 refs[r] = (x1, y1)
-                lxref.append(x1)
-                lyref.append(y1)
+    return h_refs, v_refs, refs
 
-    data = easyplot_db_to_data_array(input_database)
 
-    with open(output_csv_file, 'w') as dest:
-        dest_writer = csv.writer(dest, delimiter=csv_delimiter)
-        for i, row in enumerate(data):
-            if i == 0 or (row[0] in refs.keys() and not relative):
-                continue
-            d_row = [val for val in row]
-            dbh = 15
-            if row[CIRCS_IDX]:
-                circs = [float(c) for c in row[CIRCS_IDX].split(';')]
-                dbh = round(stem_circ_to_dbh(*circs), 1)
+def iter_counted(chunks, profile):
+    """
+    Count the compiled and positioned rows of the chunks in profile, and
+    yield the chunks unchanged.
+    """
+    for d_rows in chunks:
+        positioned = sum(1 for d_row in d_rows if d_row[REF_IDX])
+        profile.count('rows_compiled', len(d_rows))
+        profile.count('rows_positioned', positioned)
+        # Each positioned row looks its reference up once.
+        profile.count('reference_lookups', positioned)
+        yield d_rows
+
+
+def resolve_positions(input_database, refs, plot_azimuth, north_oriented,
+                      relative, profile=None):
+    """
+    Position the trees used as references, from the fixed references or, in
+    relative mode, from the origin only. Return the positions of the fixed
+    references and of the resolved trees, and the unresolved ones (see
+    resolve_reference_graph).
+    """
+    index = easyplot_db_to_reference_index(input_database)
+    if profile is not None:
+        # The rows used as references are all read with a single query.
+        profile.count('reference_queries')
+        profile.count('reference_index_rows', len(index))
+    return index_positions(index, refs, plot_azimuth, north_oriented,
+                           relative, profile)
+
+
+def index_positions(index, refs, plot_azimuth, north_oriented, relative,
+                    profile=None):
+    """
+    Same as resolve_positions, from an already loaded reference index (see
+    easyplot_db_to_reference_index).
+    """
+    fixed_refs = {ORIGIN_ID: (0, 0)} if relative else refs
+    resolved, unresolved = resolve_reference_graph(
+        index, fixed_refs, reference_dbhs(index), plot_azimuth,
+        north_oriented, profile
+    )
+    positions = dict(fixed_refs)
+    positions.update(resolved)
+    return positions, unresolved
+
+
+def compile_rows(rows, index, plot_azimuth, north_oriented, relative,
+                 letters_abscissa, force_0_100_bounds, with_plot_data=False):
+    """
+    Compile the already loaded rows of an easyplot database (see
+    easyplot_db_to_data_array), given its reference index, without any
+    database access. Return the compiled rows and, if with_plot_data is
+    True, the plot data of the map (see iter_plot_data), else None.
+    """
+    errors = parse_circumferences([row[CIRCS_IDX] for row in rows])[2]
+    if errors:
+        raise ValueError(format_circumferences_errors(
+            [(rows[i][ID_IDX], e) for i, e in errors]
+        ))
+    refs = make_references(plot_azimuth, north_oriented, letters_abscissa)[2]
+    positions, unresolved = index_positions(index, refs, plot_azimuth,
+                                            north_oriented, relative)
+    chunks = iter_rows_to_compile([rows], refs, relative)
+    chunks = iter_dbh(chunks)
+    chunks = iter_positions(chunks, positions, unresolved, plot_azimuth,
+                            north_oriented, relative, force_0_100_bounds)
+    plot_data = None
+    if with_plot_data:
+        plot_data = {'x': [], 'y': [], 'dbh': [],
+                     'xref_rel': [], 'yref_rel': []}
+        chunks = iter_plot_data(chunks, refs, relative, plot_data)
+    d_rows = [d_row for chunk in chunks for d_row in chunk]
+    return d_rows, plot_data
+
+
+def iter_compile(input_database, plot_azimuth, north_oriented, relative,
+                 letters_abscissa, force_0_100_bounds, chunk_size=CHUNK_SIZE,
+                 state_file=None, profile=None):
+    """
+    Compile an easyplot database, streaming it through the dbh and
+    positioning stages by chunks of chunk_size rows, and yield the chunks
+    of compiled rows (sequences with the columns of the ncpippn table, not
+    to be modified). If state_file is given, the compilation is
+    incremental: the results stored in state_file by the previous
+    compilation are reused for the rows whose inputs did not change, and
+    only the other rows and the trees positioned from them are recomputed
+    (see iter_incremental_compile). If profile (a
+    CompileProfile) is given, the stages are timed and counted in it.
+    """
+    refs = make_references(plot_azimuth, north_oriented, letters_abscissa)[2]
+
+    if state_file is not None:
+        options_key = (plot_azimuth, north_oriented, relative,
+                       letters_abscissa, force_0_100_bounds)
+        chunks = iter_incremental_compile(
+            input_database, state_file, refs, options_key, plot_azimuth,
+            north_oriented, relative, force_0_100_bounds, chunk_size, profile
+        )
+    else:
+        with profile_stage(profile, 'check'):
+            check_circumferences(input_database, chunk_size)
+
+        with profile_stage(profile, 'references'):
+            positions, unresolved = resolve_positions(
+                input_database, refs, plot_azimuth, north_oriented, relative,
+                profile
+            )
+
+        chunks = iter_easyplot_db(input_database, chunk_size)
+        chunks = iter_rows_to_compile(chunks, refs, relative)
+        chunks = profiled(chunks, profile, 'load')
+        chunks = profiled(iter_dbh(chunks), profile, 'dbh')
+        chunks = iter_positions(chunks, positions, unresolved, plot_azimuth,
+                                north_oriented, relative, force_0_100_bounds)
+        chunks = profiled(chunks, profile, 'positions')
+    if profile is not None:
+        chunks = iter_counted(chunks, profile)
+    for d_rows in chunks:
+        yield d_rows
+
+
+def rows_to_columns(d_rows):
+    """
+    Convert a list of compiled rows into a dict of typed NumPy columns (see
+    compile_columns).
+    """
+    columns = {}
+    for k, values in zip(COLUMNS, zip(*d_rows) if d_rows
+                         else [()] * len(COLUMNS)):
+        if k in STR_COLUMNS:
+            col = np.empty(len(values), dtype=object)
+            col[:] = values
+        elif k == 'strata':
+            # The device writes '' in the empty columns.
+            col = np.array([-1 if v is None or v == '' else v
+                            for v in values], dtype=np.int64)
+        else:
+            col = np.array([np.nan if v is None or v == '' else v
+                            for v in values], dtype=float)
+        columns[k] = col
+    return columns
+
+
+def compile_columns(input_database, plot_azimuth, north_oriented=False,
+                    relative=False, letters_abscissa=False,
+                    force_0_100_bounds=True, chunk_size=CHUNK_SIZE):
+    """
+    Compile an easyplot database and return the compiled table as a dict of
+    typed NumPy columns, keyed by the names of COLUMNS: object arrays for
+    the text columns (None when empty), an int64 array for strata (-1 when
+    empty, NULL or '') and float arrays for the others (NaN when empty).
+    """
+    return concat_columns([
+        rows_to_columns(d_rows) for d_rows in
+        iter_compile(input_database, plot_azimuth, north_oriented, relative,
+                     letters_abscissa, force_0_100_bounds, chunk_size)
+    ])
+
+
+def compile_dbh_columns(input_database, chunk_size=CHUNK_SIZE):
+    """
+    Compute the dbh of the trees of an easyplot database (the rows compiled
+    in the plot oriented mode, see iter_rows_to_compile), without
+    positioning them, and return them as compile_columns does, the x and y
+    columns being those of the database. Enough for the stand metrics,
+    which do not depend on the positions, even with unresolved references.
+    """
+    refs = make_references(0, False, False)[2]
+    chunks = iter_easyplot_db(input_database, chunk_size)
+    chunks = iter_rows_to_compile(chunks, refs, False)
+    column_chunks = []
+    for rows, dbhs, has_circs in iter_dbh(chunks):
+        d_rows = [[val for val in row] for row in rows]
+        for d_row, dbh, row_has_circs in zip(d_rows, dbhs, has_circs):
+            if row_has_circs:
                 d_row[DBH_IDX] = dbh
-            if row[REF_IDX]:
-                ref = d_row[REF_IDX]
-                hdist = float(d_row[HDIST_IDX])
-                azimuth = float(d_row[AZIMUTH_IDX])
-                if relative:
-                    x, y = get_xy(ref, dbh * 0.01, hdist, azimuth, rel_refs,
-                                  plot_azimuth, north_oriented, input_database)
-                    rel_refs[row[ID_IDX]] = (x, y)
-                    ldbh.append(dbh)
-                    lx.append(x)
-                    ly.append(y)
-                    d_row[X_IDX] = x
-                    d_row[Y_IDX] = y
-                    if row[ID_IDX] in refs:
-                        lxref_rel.append(x)
-                        lyref_rel.append(y)
-                else:
-                    x, y = get_xy(ref, dbh * 0.01, hdist, azimuth, refs,
-                                  plot_azimuth, north_oriented, input_database,
-                                  force_0_100_bounds)
-                    ldbh.append(dbh)
-                    lx.append(x)
-                    ly.append(y)
-                    d_row[X_IDX] = x
-                    d_row[Y_IDX] = y
-            dest_writer.writerow(d_row)
+        column_chunks.append(rows_to_columns(d_rows))
+    return concat_columns(column_chunks)
 
-    if output_plot_png:
-        # Plot the results
-        fig, ax = plt.subplots(figsize=(16, 16))
-
-        ax.scatter(lx, ly, ldbh, alpha=0.4)
-        if relative:
-            ax.scatter(lxref_rel, lyref_rel, 50, color='y')
-        ax.scatter(lxref, lyref, color='r')
-
-        dtext = [1.5, -4]
-        for i, hr in enumerate(h_refs):
-            for j, vr in enumerate([str(v_refs[0]), str(v_refs[len(v_refs) - 1])]):
-                if letters_abscissa:
-                    r = ''.join([hr, vr])
-                else:
-                    r = ''.join([vr, hr])
-                ax.text(refs[r][0] + dtext[j], refs[r][1] + dtext[j], r,
-                        fontsize=12, color='g')
 
+def concat_columns(column_chunks):
+    """
+    Concatenate chunks of NumPy columns (see rows_to_columns).
+    """
+    if not column_chunks:
+        return rows_to_columns([])
+    return dict((k, np.concatenate([c[k] for c in column_chunks]))
+                for k in COLUMNS)
+
+
+def iter_columns(chunks, column_chunks):
+    """
+    Append the chunks of compiled rows, as NumPy columns (see
+    rows_to_columns), to column_chunks, and yield the chunks unchanged.
+    """
+    for d_rows in chunks:
+        column_chunks.append(rows_to_columns(d_rows))
+        yield d_rows
+
+
+def save_plot_matplotlib(output_plot_png, h_refs, v_refs, refs,
+                         letters_abscissa, relative, plot_data):
+    """
+    Save a map of the plot with matplotlib, as svg if output_plot_png ends
+    with '.svg', as png else.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    lxref = [xy[0] for xy in refs.values()]
+    lyref = [xy[1] for xy in refs.values()]
+
+    # Plot the results
+    fig, ax = plt.subplots(figsize=(16, 16))
+
+    ax.scatter(plot_data['x'], plot_data['y'], plot_data['dbh'], alpha=0.4)
+    if relative:
+        ax.scatter(plot_data['xref_rel'], plot_data['yref_rel'], 50,
+                   color='y')
+    ax.scatter(lxref, lyref, color='r')
+
+    dtext = [1.5, -4]
+    for i, hr in enumerate(h_refs):
+        for j, vr in enumerate([str(v_refs[0]), str(v_refs[len(v_refs) - 1])]):
+            if letters_abscissa:
+                r = ''.join([hr, vr])
+            else:
+                r = ''.join([vr, hr])
+            ax.text(refs[r][0] + dtext[j], refs[r][1] + dtext[j], r,
+                    fontsize=12, color='g')
+
+    if output_plot_png.lower().endswith('.svg'):
+        plt.savefig(output_plot_png, format='svg')
+    else:
         plt.savefig(output_plot_png, format='png')
+    plt.close(fig)
+
+
+def save_plot_png(output_plot_png, h_refs, v_refs, refs, letters_abscissa,
+                  relative, plot_data, plot_backend='builtin'):
+    """
+    Save a map of the plot, with the fixed references and the trees of
+    plot_data (see iter_plot_data), as svg if output_plot_png ends with
+    '.svg', as png else. The map is rendered by ncpippn_map, or by
+    matplotlib if plot_backend is 'matplotlib'.
+    """
+    if plot_backend == 'matplotlib':
+        save_plot_matplotlib(output_plot_png, h_refs, v_refs, refs,
+                             letters_abscissa, relative, plot_data)
+    elif plot_backend == 'builtin':
+        ncpippn_map.save_map(output_plot_png, h_refs, v_refs, refs,
+                             letters_abscissa, relative, plot_data)
+    else:
+        raise ValueError("Unknown plot backend: {}".format(plot_backend))
+
+
+def compile_data(input_database, output_csv_file, csv_delimiter, plot_azimuth,
+                 output_plot_png, north_oriented, relative,
+                 letters_abscissa, force_0_100_bounds, chunk_size=CHUNK_SIZE,
+                 write_back_db=False, incremental=False, profile=False,
+                 plot_backend='builtin', output_columnar=None,
+                 output_spatial_index=None):
+    """
+    Compile an easyplot database into a csv file, and optionally a png (or
+    svg) map of the plot, rendered with plot_backend (see iter_compile and
+    save_plot_png). If write_back_db is True, the computed
+    dbh, x and y are also written back in the database, and the compile
+    parameters in its compilation table. If incremental is True, the
+    results of the previous compilation to output_csv_file, stored in
+    output_csv_file + '.state', are reused for the rows whose inputs did not
+    change, only the others and the trees positioned from them being
+    recomputed. If profile is True, the wall time and call counts of each stage
+    and the compilation counters are written as json in
+    output_csv_file + '.profile.json', and returned. If output_columnar is
+    given, the compiled table is also written in this file in the columnar
+    format of ncpippn_columnar. If output_spatial_index is given, a grid
+    index of the computed positions (see ncpippn_spatial.GridIndex) is
+    saved in this .npz file.
+    """
+    parameters = {
+        'plot_azimuth': plot_azimuth,
+        'north_oriented': north_oriented,
+        'relative': relative,
+        'letters_abscissa': letters_abscissa,
+        'force_0_100_bounds': force_0_100_bounds,
+    }
+    compile_profile = CompileProfile() if profile else None
+    h_refs, v_refs, refs = make_references(plot_azimuth, north_oriented,
+                                           letters_abscissa)
+
+    state_file = output_csv_file + '.state' if incremental else None
+    chunks = iter_compile(input_database, plot_azimuth, north_oriented,
+                          relative, letters_abscissa, force_0_100_bounds,
+                          chunk_size, state_file, compile_profile)
+    if output_plot_png:
+        plot_data = {'x': [], 'y': [], 'dbh': [],
+                     'xref_rel': [], 'yref_rel': []}
+        chunks = iter_plot_data(chunks, refs, relative, plot_data)
+        chunks = profiled(chunks, compile_profile, 'plot_data')
+    if write_back_db:
+        connection = sqlite3.connect(input_database)
+        chunks = iter_write_back(chunks, connection)
+        chunks = profiled(chunks, compile_profile, 'write_back')
+    if output_columnar or output_spatial_index:
+        column_chunks = []
+        chunks = iter_columns(chunks, column_chunks)
+        chunks = profiled(chunks, compile_profile, 'columns')
+
+    # The csv is written next to the output and moved over it once the
+    # compilation succeeded, so a failed compilation leaves any previous
+    # output untouched.
+    tmp_csv_file = output_csv_file + '.tmp'
+    try:
+        with open(tmp_csv_file, 'w') as dest:
+            dest_writer = csv.writer(dest, delimiter=csv_delimiter)
+            for d_rows in chunks:
+                with profile_stage(compile_profile, 'csv'):
+                    dest_writer.writerows(d_rows)
+        if write_back_db:
+            with profile_stage(compile_profile, 'write_back'):
+                write_back(connection, parameters)
+        os.replace(tmp_csv_file, output_csv_file)
+    finally:
+        if write_back_db:
+            connection.close()
+        if os.path.exists(tmp_csv_file):
+            os.remove(tmp_csv_file)
+
+    if output_columnar or output_spatial_index:
+        columns = concat_columns(column_chunks)
+    if output_columnar:
+        with profile_stage(compile_profile, 'columnar'):
+            ncpippn_columnar.write_columnar(output_columnar, columns)
+    if output_spatial_index:
+        with profile_stage(compile_profile, 'spatial_index'):
+            ncpippn_spatial.columns_grid_index(columns).save(
+                output_spatial_index
+            )
+
+    if output_plot_png:
+        with profile_stage(compile_profile, 'png'):
+            save_plot_png(output_plot_png, h_refs, v_refs, refs,
+                          letters_abscissa, relative, plot_data,
+                          plot_backend)
+
+    if profile:
+        report = compile_profile.report()
+        report['input_database'] = input_database
+        report['parameters'] = parameters
+        with open(output_csv_file + '.profile.json', 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        return report
+
+
+def compile_shard(task):
+    """
+    Compile a shard of an easyplot database (a rowid range, see
+    shard_ranges) into a csv file, reading it through read-only
+    connections. The reference positions are resolved beforehand for the
+    whole database. Return the circumferences errors of the shard, as (id,
+    message) tuples, and, if plot_data is requested, its plot data (see
+    iter_plot_data). Nothing is compiled if the shard has errors.
+    """
+    (input_database, first_rowid, last_rowid, is_first, shard_csv_file,
+     csv_delimiter, positions, unresolved, refs, plot_azimuth,
+     north_oriented, relative, force_0_100_bounds, chunk_size,
+     with_plot_data) = task
+
+    errors = []
+    for rows in iter_easyplot_db_shard(input_database, first_rowid,
+                                       last_rowid, chunk_size,
+                                       'id, circumferences'):
+        chunk_errors = parse_circumferences([row[1] for row in rows])[2]
+        errors.extend((rows[i][0], e) for i, e in chunk_errors)
+    if errors:
+        return errors, None
+
+    chunks = iter_easyplot_db_shard(input_database, first_rowid, last_rowid,
+                                    chunk_size)
+    chunks = iter_rows_to_compile(chunks, refs, relative, is_first)
+    chunks = iter_dbh(chunks)
+    chunks = iter_positions(chunks, positions, unresolved, plot_azimuth,
+                            north_oriented, relative, force_0_100_bounds)
+    plot_data = None
+    if with_plot_data:
+        plot_data = {'x': [], 'y': [], 'dbh': [],
+                     'xref_rel': [], 'yref_rel': []}
+        chunks = iter_plot_data(chunks, refs, relative, plot_data)
+    with open(shard_csv_file, 'w') as dest:
+        dest_writer = csv.writer(dest, delimiter=csv_delimiter)
+        for d_rows in chunks:
+            dest_writer.writerows(d_rows)
+    return errors, plot_data
+
+
+def sharded_compile_data(input_database, output_csv_file, csv_delimiter,
+                         plot_azimuth, output_plot_png, north_oriented,
+                         relative, letters_abscissa, force_0_100_bounds,
+                         chunk_size=CHUNK_SIZE, shards=None, processes=None,
+                         plot_backend='builtin'):
+    """
+    Same as compile_data, over a pool of processes: the trees used as
+    references are positioned first, then the other rows are split into
+    shards contiguous rowid ranges (default: one per process), compiled in
+    parallel (see compile_shard), and the shard outputs are concatenated in
+    the table order.
+    """
+    h_refs, v_refs, refs = make_references(plot_azimuth, north_oriented,
+                                           letters_abscissa)
+    positions, unresolved = resolve_positions(input_database, refs,
+                                              plot_azimuth, north_oriented,
+                                              relative)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    ranges = shard_ranges(input_database, shards or processes)
+
+    tmp_dir = tempfile.mkdtemp(
+        prefix='.shards_', dir=os.path.dirname(os.path.abspath(output_csv_file))
+    )
+    try:
+        tasks = [(input_database, first_rowid, last_rowid, k == 0,
+                  os.path.join(tmp_dir, '{}.csv'.format(k)), csv_delimiter,
+                  positions, unresolved, refs, plot_azimuth, north_oriented,
+                  relative, force_0_100_bounds, chunk_size,
+                  bool(output_plot_png))
+                 for k, (first_rowid, last_rowid) in enumerate(ranges)]
+        pool = multiprocessing.Pool(min(processes, len(tasks)) or 1)
+        try:
+            results = pool.map(compile_shard, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        errors = [e for shard_errors, _ in results for e in shard_errors]
+        if errors:
+            raise ValueError(format_circumferences_errors(errors))
+        merged_csv_file = os.path.join(tmp_dir, 'merged.csv')
+        with open(merged_csv_file, 'wb') as dest:
+            for task in tasks:
+                with open(task[4], 'rb') as src:
+                    shutil.copyfileobj(src, dest)
+        os.replace(merged_csv_file, output_csv_file)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if output_plot_png:
+        plot_data = {'x': [], 'y': [], 'dbh': [],
+                     'xref_rel': [], 'yref_rel': []}
+        for _, shard_plot_data in results:
+            for k, values in shard_plot_data.items():
+                plot_data[k].extend(values)
+        save_plot_png(output_plot_png, h_refs, v_refs, refs,
+                      letters_abscissa, relative, plot_data, plot_backend)
+
+
+def sql_stem_circ_to_dbh(circumferences):
+    """
+    SQLite function: the dbh (in cm, rounded to 1 decimal, as in the
+    compiled table) of a circumferences value, NULL without circumferences.
+    """
+    if not circumferences:
+        return None
+    return round(stem_circ_to_dbh(*parse_stems(circumferences)), 1)
+
+
+def sql_basal_area(circumferences):
+    """
+    SQLite function: the basal area (in m2) of the stems of a
+    circumferences value (in cm), NULL without circumferences.
+    """
+    if not circumferences:
+        return None
+    return sum(c ** 2 for c in parse_stems(circumferences)) / \
+        (4 * math.pi) / 10000
+
+
+def sql_circumferences_error(circumferences):
+    """
+    SQLite function: the problem of a malformed circumferences value (see
+    parse_stems), NULL if it is valid or empty.
+    """
+    if not circumferences:
+        return None
+    try:
+        parse_stems(circumferences)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def register_sql_functions(connection):
+    """
+    Register stem_circ_to_dbh, basal_area and circumferences_error as
+    functions of an SQLite connection, so they can be computed inside
+    queries.
+    """
+    connection.create_function('stem_circ_to_dbh', 1, sql_stem_circ_to_dbh)
+    connection.create_function('basal_area', 1, sql_basal_area)
+    connection.create_function('circumferences_error', 1,
+                               sql_circumferences_error)
+
+
+SUMMARY_COLUMNS = ('trees', 'stems', 'measured_trees', 'mean_dbh',
+                   'max_dbh', 'basal_area')
+
+SUMMARY_QUERY = \
+    """
+    SELECT {group}, count(*),
+        sum(CASE WHEN circumferences IS NULL OR circumferences = '' THEN 0
+            ELSE length(circumferences)
+                - length(replace(circumferences, ';', '')) + 1 END),
+        count(dbh), round(avg(dbh), 1), max(dbh), round(sum(ba), 4)
+    FROM (
+        SELECT {group}, circumferences,
+            stem_circ_to_dbh(circumferences) AS dbh,
+            basal_area(circumferences) AS ba
+        FROM ncpippn WHERE id NOT IN ({refs})
+            AND (circumferences IS NOT NULL AND circumferences != ''
+                 OR reference IS NOT NULL AND reference != '')
+    )
+    GROUP BY {group} ORDER BY {group};
+    """
+
+CIRCUMFERENCES_ERRORS_QUERY = \
+    """
+    SELECT id, error FROM (
+        SELECT id, circumferences_error(circumferences) AS error
+        FROM ncpippn
+    )
+    WHERE error IS NOT NULL ORDER BY rowid;
+    """
+
+
+def summary_report(input_database, group_by):
+    """
+    Compute the summary of the trees (the rows which are not fixed
+    references and have circumferences or a reference, leaving out the
+    blank generated ids) of an easyplot database per quadrat or per strata
+    (group_by), inside SQLite: a list of rows with the group and the
+    SUMMARY_COLUMNS (number of trees, of stems, of trees with
+    circumferences, mean and max dbh in cm, basal area in m2). The
+    circumferences are validated inside SQLite too, only the malformed
+    rows being fetched: a ValueError listing them is raised, if any.
+    """
+    if group_by not in ('quadrat', 'strata'):
+        raise ValueError("Unknown summary group: {}".format(group_by))
+    refs = sorted(make_references(0, False, False)[2])
+    c = connect_read_only(input_database)
+    try:
+        register_sql_functions(c)
+        cur = c.cursor()
+        errors = cur.execute(CIRCUMFERENCES_ERRORS_QUERY).fetchall()
+        if errors:
+            raise ValueError(format_circumferences_errors(errors))
+        cur.execute(SUMMARY_QUERY.format(group=group_by,
+                                         refs=', '.join('?' * len(refs))),
+                    refs)
+        return cur.fetchall()
+    finally:
+        c.close()
+
+
+def compile_cache_key(input_database, csv_delimiter, plot_azimuth,
+                      north_oriented, relative, letters_abscissa,
+                      force_0_100_bounds):
+    """
+    Return the cache key of a compilation: a hash of the CACHE_VERSION, of
+    the database contents and of every argument the outputs depend on.
+    """
+    digest = hashlib.sha256()
+    digest.update('{}\n'.format(CACHE_VERSION).encode('utf-8'))
+    with open(input_database, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(repr((csv_delimiter, float(plot_azimuth),
+                        bool(north_oriented), bool(relative),
+                        bool(letters_abscissa), bool(force_0_100_bounds)))
+                  .encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_entry_size(entry):
+    return sum(os.path.getsize(os.path.join(entry, f))
+               for f in os.listdir(entry))
+
+
+def evict_cache(cache_dir, cache_size):
+    """
+    Remove the least recently used entries of the compile cache until its
+    size is at most cache_size bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if os.path.isdir(entry) and not name.startswith('.'):
+            entries.append((os.path.getmtime(entry), cache_entry_size(entry),
+                            entry))
+    entries.sort()
+    total = sum(e[1] for e in entries)
+    for mtime, size, entry in entries:
+        if total <= cache_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def cached_compile_data(cache_dir, cache_size, input_database,
+                        output_csv_file, csv_delimiter, plot_azimuth,
+                        output_plot_png, north_oriented, relative,
+                        letters_abscissa, force_0_100_bounds,
+                        chunk_size=CHUNK_SIZE, plot_backend='builtin'):
+    """
+    Same as compile_data, through a content-addressed compile cache stored
+    in cache_dir. If the outputs of an identical compilation (same database
+    contents and arguments) are in the cache, they are copied to
+    output_csv_file (and output_plot_png) instead of compiling. Else the
+    database is compiled and the outputs are stored in the cache, the least
+    recently used entries being evicted to keep the cache size under
+    cache_size bytes. Return True on a cache hit, False else.
+    """
+    key = compile_cache_key(input_database, csv_delimiter, plot_azimuth,
+                            north_oriented, relative, letters_abscissa,
+                            force_0_100_bounds)
+    entry = os.path.join(cache_dir, key)
+    cached_csv = os.path.join(entry, 'output.csv')
+    cached_png = None
+    if output_plot_png:
+        # The map file depends on its renderer and format.
+        cached_png = os.path.join(entry, 'output_{}{}'.format(
+            plot_backend, os.path.splitext(output_plot_png)[1].lower()
+        ))
+    if os.path.exists(cached_csv) and \
+            (not output_plot_png or os.path.exists(cached_png)):
+        shutil.copyfile(cached_csv, output_csv_file)
+        if output_plot_png:
+            shutil.copyfile(cached_png, output_plot_png)
+        # Mark the entry as recently used.
+        os.utime(entry, None)
+        return True
+    compile_data(input_database, output_csv_file, csv_delimiter,
+                 plot_azimuth, output_plot_png, north_oriented, relative,
+                 letters_abscissa, force_0_100_bounds, chunk_size,
+                 plot_backend=plot_backend)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    # Build the entry aside and move it in place, so concurrent readers
+    # never see a partial entry.
+    tmp_entry = tempfile.mkdtemp(prefix='.', dir=cache_dir)
+    try:
+        shutil.copyfile(output_csv_file, os.path.join(tmp_entry, 'output.csv'))
+        if output_plot_png:
+            shutil.copyfile(output_plot_png, os.path.join(
+                tmp_entry, os.path.basename(cached_png)
+            ))
+        if os.path.exists(entry):
+            # Keep the other maps of the entry.
+            for name in os.listdir(entry):
+                if not os.path.exists(os.path.join(tmp_entry, name)):
+                    shutil.copyfile(os.path.join(entry, name),
+                                    os.path.join(tmp_entry, name))
+            shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # Another process stored the same entry in the meantime.
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+    evict_cache(cache_dir, cache_size)
+    return False
 
 
 if __name__ == '__main__':
@@ -300,7 +1707,35 @@ if __name__ == '__main__':
         default=None,
         help="""
             If specified, NCPIPPN Compiler will generate a png representation
-            of the plot, with the positions of the trees.
+            of the plot, with the positions of the trees (an svg one if the
+            file name ends with '.svg').
+            """
+    )
+    parser.add_argument(
+        '--output_columnar',
+        default=None,
+        help="""
+            If specified, the compiled table is also written in this file,
+            in a columnar binary format readable with memory mapping (see
+            ncpippn_columnar.read_columnar).
+            """
+    )
+    parser.add_argument(
+        '--output_spatial_index',
+        default=None,
+        help="""
+            If specified, a spatial index of the computed positions (a grid
+            of 10 m cells, answering radius and nearest neighbours queries,
+            see ncpippn_spatial) is saved in this .npz file.
+            """
+    )
+    parser.add_argument(
+        '--plot_backend',
+        choices=PLOT_BACKENDS,
+        default='builtin',
+        help="""
+            The renderer of the plot map: the built-in one (fast, no extra
+            dependency), or matplotlib (which must be installed).
             """
     )
     parser.add_argument(
@@ -339,6 +1774,98 @@ if __name__ == '__main__':
             and those exceeding 100 to 100.
             """
     )
+    parser.add_argument(
+        '--write_back',
+        type=str2bool,
+        default=False,
+        help="""
+            If True, the computed dbh, x and y are also written back in the
+            input database, and the compile parameters in its compilation
+            table (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--incremental',
+        type=str2bool,
+        default=False,
+        help="""
+            If True, only the rows whose inputs changed since the previous
+            compilation to the same output file, and the trees positioned
+            from them, are recomputed, the others are reused from the
+            '<output_csv_file>.state' SQLite database (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--cache_dir',
+        default=None,
+        help="""
+            If specified, the outputs are cached in this directory, keyed by
+            the compiler version, the database contents and the compile
+            arguments. Compiling the
+            same database with the same arguments again copies the cached
+            outputs instead of compiling.
+            """
+    )
+    parser.add_argument(
+        '--cache_size',
+        type=float,
+        default=CACHE_SIZE / (1024 * 1024),
+        help="""
+            The size bound of the cache, in MB. The least recently used
+            outputs are evicted beyond it.
+            """
+    )
+    parser.add_argument(
+        '--summary',
+        choices=('quadrat', 'strata'),
+        default=None,
+        help="""
+            If specified, instead of compiling, NCPIPPN Compiler writes a
+            summary of the trees per quadrat or per strata (number of trees
+            and stems, mean and max dbh, basal area) in the output file,
+            computed inside SQLite.
+            """
+    )
+    parser.add_argument(
+        '--profile',
+        type=str2bool,
+        default=False,
+        help="""
+            If True, the wall time and call counts of each compilation stage
+            and the compilation counters (reference lookups, reference chain
+            depth...) are written as json in
+            '<output_csv_file>.profile.json' (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=None,
+        help="""
+            If specified, the database is compiled over a pool of processes:
+            the trees used as references are positioned first, then the
+            other rows are split into this number of rowid ranges (shards),
+            compiled in parallel and merged back in the table order.
+            """
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="""
+            The number of worker processes of a sharded compilation
+            (default: the number of CPUs).
+            """
+    )
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=CHUNK_SIZE,
+        help="""
+            The number of rows read and compiled at a time. The memory used
+            by the compilation is bounded by this value.
+            """
+    )
 
     args = parser.parse_args()
 
@@ -347,10 +1874,33 @@ if __name__ == '__main__':
     csv_separator = args.csv_separator
     plot_azimuth = args.plot_azimuth
     output_plot_png = args.output_plot_png
+    plot_backend = args.plot_backend
+    output_columnar = args.output_columnar
+    output_spatial_index = args.output_spatial_index
     north_oriented = args.north_oriented
     relative = args.relative
     letters_abscissa = args.letters_abscissa
     force_0_100_bounds = args.force_0_100_bounds
+    chunk_size = args.chunk_size
+    write_back_db = args.write_back
+    incremental = args.incremental
+    profile = args.profile
+    cache_dir = args.cache_dir
+    cache_size = int(args.cache_size * 1024 * 1024)
+    shards = args.shards
+    processes = args.processes
+
+    if cache_dir is not None and (write_back_db or incremental or profile):
+        parser.error("--cache_dir can not be used with --write_back, "
+                     "--incremental or --profile")
+    if shards is not None and (write_back_db or incremental or profile or
+                               cache_dir is not None):
+        parser.error("--shards can not be used with --write_back, "
+                     "--incremental, --profile or --cache_dir")
+    if (output_columnar is not None or output_spatial_index is not None) \
+            and (shards is not None or cache_dir is not None):
+        parser.error("--output_columnar and --output_spatial_index can not "
+                     "be used with --shards or --cache_dir")
 
     if os.path.exists(output_file):
         b = query_yes_no("{} already exist, do you want to overwrite it?".format(output_file))
@@ -365,6 +1915,50 @@ if __name__ == '__main__':
             print("Aborting...")
             sys.exit()
 
+    if args.summary is not None:
+        with open(output_file, 'w') as dest:
+            dest_writer = csv.writer(dest, delimiter=csv_separator)
+            dest_writer.writerow((args.summary,) + SUMMARY_COLUMNS)
+            dest_writer.writerows(summary_report(input_database,
+                                                 args.summary))
+        sys.exit()
+
+    if cache_dir is not None:
+        cached_compile_data(
+            cache_dir,
+            cache_size,
+            input_database,
+            output_file,
+            csv_separator,
+            plot_azimuth,
+            output_plot_png,
+            north_oriented,
+            relative,
+            letters_abscissa,
+            force_0_100_bounds,
+            chunk_size,
+            plot_backend
+        )
+        sys.exit()
+
+    if shards is not None:
+        sharded_compile_data(
+            input_database,
+            output_file,
+            csv_separator,
+            plot_azimuth,
+            output_plot_png,
+            north_oriented,
+            relative,
+            letters_abscissa,
+            force_0_100_bounds,
+            chunk_size,
+            shards,
+            processes,
+            plot_backend
+        )
+        sys.exit()
+
     compile_data(
         input_database,
         output_file,
@@ -374,5 +1968,12 @@ if __name__ == '__main__':
         north_oriented,
         relative,
         letters_abscissa,
-        force_0_100_bounds
+        force_0_100_bounds,
+        chunk_size,
+        write_back_db,
+        incremental,
+        profile,
+        plot_backend,
+        output_columnar,
+        output_spatial_index
     )
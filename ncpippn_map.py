@@ -0,0 +1,309 @@
+#!/usr/bin/python
+# coding: utf-8
+
+"""
+Lightweight renderer of the plot maps produced by ncpippn_compiler, writing
+svg or png files directly, without matplotlib.
+"""
+
+import os
+import zlib
+import struct
+
+import numpy as np
+
+
+# Colors of the map elements (those of the matplotlib map).
+TREE_COLOR = (0x1f, 0x77, 0xb4)
+TREE_ALPHA = 0.4
+REL_REF_COLOR = (0xbf, 0xbf, 0x00)
+REF_COLOR = (0xff, 0x00, 0x00)
+LABEL_COLOR = (0x00, 0x80, 0x00)
+FRAME_COLOR = (0x00, 0x00, 0x00)
+
+# Marker areas, in points^2, as in the matplotlib map.
+REL_REF_AREA = 50
+REF_AREA = 36
+
+# Offsets of the reference labels, in meters.
+LABEL_OFFSETS = [1.5, -4]
+
+# Default size of the maps, in pixels (a 16 inches figure at 100 dpi).
+MAP_SIZE = 1600
+MARGIN = 0.05
+
+# 5x7 bitmap font for the reference labels.
+FONT = {
+    'A': ('01110', '10001', '10001', '11111', '10001', '10001', '10001'),
+    'B': ('11110', '10001', '10001', '11110', '10001', '10001', '11110'),
+    'C': ('01110', '10001', '10000', '10000', '10000', '10001', '01110'),
+    'D': ('11110', '10001', '10001', '10001', '10001', '10001', '11110'),
+    'E': ('11111', '10000', '10000', '11110', '10000', '10000', '11111'),
+    'F': ('11111', '10000', '10000', '11110', '10000', '10000', '10000'),
+    'G': ('01110', '10001', '10000', '10111', '10001', '10001', '01111'),
+    'H': ('10001', '10001', '10001', '11111', '10001', '10001', '10001'),
+    'I': ('01110', '00100', '00100', '00100', '00100', '00100', '01110'),
+    'J': ('00111', '00010', '00010', '00010', '00010', '10010', '01100'),
+    'K': ('10001', '10010', '10100', '11000', '10100', '10010', '10001'),
+    '0': ('01110', '10001', '10011', '10101', '11001', '10001', '01110'),
+    '1': ('00100', '01100', '00100', '00100', '00100', '00100', '01110'),
+    '2': ('01110', '10001', '00001', '00010', '00100', '01000', '11111'),
+    '3': ('11111', '00010', '00100', '00010', '00001', '10001', '01110'),
+    '4': ('00010', '00110', '01010', '10010', '11111', '00010', '00010'),
+    '5': ('11111', '10000', '11110', '00001', '00001', '10001', '01110'),
+    '6': ('00110', '01000', '10000', '11110', '10001', '10001', '01110'),
+    '7': ('11111', '00001', '00010', '00100', '01000', '01000', '01000'),
+    '8': ('01110', '10001', '10001', '01110', '10001', '10001', '01110'),
+    '9': ('01110', '10001', '10001', '01111', '00001', '00010', '01100'),
+}
+
+
+def reference_labels(h_refs, v_refs, refs, letters_abscissa):
+    """
+    Return the (label, x, y) reference labels of the map: the first and last
+    references of each line of the grid.
+    """
+    labels = []
+    for i, hr in enumerate(h_refs):
+        for j, vr in enumerate([str(v_refs[0]), str(v_refs[len(v_refs) - 1])]):
+            if letters_abscissa:
+                r = ''.join([hr, vr])
+            else:
+                r = ''.join([vr, hr])
+            labels.append((r, refs[r][0] + LABEL_OFFSETS[j],
+                           refs[r][1] + LABEL_OFFSETS[j]))
+    return labels
+
+
+class MapLayout(object):
+    """
+    Transformation from plot coordinates (meters) to map pixels, keeping
+    the same scale on both axes.
+    """
+
+    def __init__(self, xs, ys, size=MAP_SIZE):
+        xmin, xmax = float(np.min(xs)), float(np.max(xs))
+        ymin, ymax = float(np.min(ys)), float(np.max(ys))
+        extent = max(xmax - xmin, ymax - ymin, 1.)
+        self.size = size
+        self.scale = size * (1 - 2 * MARGIN) / extent
+        self.x0 = (xmin + xmax) / 2. - size / 2. / self.scale
+        self.y0 = (ymin + ymax) / 2. + size / 2. / self.scale
+        # Points to pixels, for the marker areas.
+        self.pt = size / (16 * 72.)
+
+    def px(self, x, y):
+        return ((np.asarray(x, dtype=float) - self.x0) * self.scale,
+                (self.y0 - np.asarray(y, dtype=float)) * self.scale)
+
+    def radius(self, area):
+        """
+        Radius in pixels of a marker of the given area in points^2.
+        """
+        return np.sqrt(np.asarray(area, dtype=float) / np.pi) * self.pt
+
+
+def map_layout(refs, plot_data, labels, size=MAP_SIZE):
+    xs = [xy[0] for xy in refs.values()] + [l[1] for l in labels] + \
+        list(plot_data['x'])
+    ys = [xy[1] for xy in refs.values()] + [l[2] for l in labels] + \
+        list(plot_data['y'])
+    return MapLayout(xs, ys, size)
+
+
+def hex_color(color):
+    return '#{:02x}{:02x}{:02x}'.format(*color)
+
+
+def map_svg(h_refs, v_refs, refs, letters_abscissa, relative, plot_data,
+            size=MAP_SIZE):
+    """
+    Return the svg map of a plot, with the fixed references and the trees
+    of plot_data (see ncpippn_compiler.iter_plot_data).
+    """
+    labels = reference_labels(h_refs, v_refs, refs, letters_abscissa)
+    layout = map_layout(refs, plot_data, labels, size)
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}" '
+           'height="{0}" viewBox="0 0 {0} {0}">'.format(size),
+           '<rect width="{0}" height="{0}" fill="#ffffff"/>'.format(size)]
+
+    def circles(x, y, r, color, alpha=None):
+        out.append('<g fill="{}"{}>'.format(
+            hex_color(color),
+            '' if alpha is None else ' fill-opacity="{}"'.format(alpha)
+        ))
+        px, py = layout.px(x, y)
+        r = np.broadcast_to(r, px.shape)
+        out.extend('<circle cx="{:.1f}" cy="{:.1f}" r="{:.1f}"/>'
+                   .format(*c) for c in zip(px, py, r))
+        out.append('</g>')
+
+    circles(plot_data['x'], plot_data['y'], layout.radius(plot_data['dbh']),
+            TREE_COLOR, TREE_ALPHA)
+    if relative:
+        circles(plot_data['xref_rel'], plot_data['yref_rel'],
+                layout.radius(REL_REF_AREA), REL_REF_COLOR)
+    circles([xy[0] for xy in refs.values()], [xy[1] for xy in refs.values()],
+            layout.radius(REF_AREA), REF_COLOR)
+
+    out.append('<g fill="{}" font-family="sans-serif" font-size="{:.0f}">'
+               .format(hex_color(LABEL_COLOR), 12 * layout.pt))
+    for label, x, y in labels:
+        px, py = layout.px(x, y)
+        out.append('<text x="{:.1f}" y="{:.1f}">{}</text>'
+                   .format(float(px), float(py), label))
+    out.append('</g>')
+    m = MARGIN * size / 2
+    out.append('<rect x="{0:.1f}" y="{0:.1f}" width="{1:.1f}" '
+               'height="{1:.1f}" fill="none" stroke="{2}"/>'
+               .format(m, size - 2 * m, hex_color(FRAME_COLOR)))
+    out.append('</svg>')
+    return '\n'.join(out)
+
+
+def draw_circles(canvas, x, y, r, color, alpha=1.):
+    """
+    Draw filled circles (centers and radius in pixels) on a float RGB
+    canvas, blending them with the given opacity.
+    """
+    h, w = canvas.shape[:2]
+    color = np.array(color, dtype=float) / 255
+    stamps = {}
+    r = np.broadcast_to(r, np.shape(x))
+    for cx, cy, cr in zip(np.round(x).astype(int), np.round(y).astype(int),
+                          np.round(np.asarray(r) * 2) / 2):
+        stamp = stamps.get(cr)
+        if stamp is None:
+            k = int(np.ceil(cr))
+            yy, xx = np.mgrid[-k:k + 1, -k:k + 1]
+            stamp = (k, xx ** 2 + yy ** 2 <= max(cr, .5) ** 2)
+            stamps[cr] = stamp
+        k, mask = stamp
+        x0, y0, x1, y1 = cx - k, cy - k, cx + k + 1, cy + k + 1
+        if x1 <= 0 or y1 <= 0 or x0 >= w or y0 >= h:
+            continue
+        mask = mask[max(0, -y0):mask.shape[0] - max(0, y1 - h),
+                    max(0, -x0):mask.shape[1] - max(0, x1 - w)]
+        region = canvas[max(0, y0):min(h, y1), max(0, x0):min(w, x1)]
+        region[mask] = region[mask] * (1 - alpha) + color * alpha
+
+
+def draw_text(canvas, text, x, y, color, scale):
+    """
+    Draw a text with the bitmap font, its baseline starting at (x, y).
+    """
+    h, w = canvas.shape[:2]
+    color = np.array(color, dtype=float) / 255
+    x, y = int(round(x)), int(round(y)) - 7 * scale
+    for char in text:
+        glyph = FONT.get(char)
+        if glyph is not None:
+            for gy, line in enumerate(glyph):
+                for gx, bit in enumerate(line):
+                    if bit == '1':
+                        px, py = x + gx * scale, y + gy * scale
+                        if 0 <= px < w - scale and 0 <= py < h - scale:
+                            canvas[py:py + scale, px:px + scale] = color
+        x += 6 * scale
+
+
+def encode_png(rgb):
+    """
+    Encode an 8 bits RGB image (a height x width x 3 uint8 array) as png.
+    """
+    h, w = rgb.shape[:2]
+    # Each scanline starts with its filter type (0, none).
+    raw = np.concatenate([np.zeros((h, 1), dtype=np.uint8),
+                          rgb.reshape(h, w * 3)], axis=1).tobytes()
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + \
+            struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return b'\x89PNG\r\n\x1a\n' + \
+        chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0)) + \
+        chunk(b'IDAT', zlib.compress(raw, 6)) + \
+        chunk(b'IEND', b'')
+
+
+def map_png(h_refs, v_refs, refs, letters_abscissa, relative, plot_data,
+            size=MAP_SIZE):
+    """
+    Return the png map of a plot (see map_svg), as bytes.
+    """
+    labels = reference_labels(h_refs, v_refs, refs, letters_abscissa)
+    layout = map_layout(refs, plot_data, labels, size)
+    canvas = np.ones((size, size, 3))
+    px, py = layout.px(plot_data['x'], plot_data['y'])
+    draw_circles(canvas, px, py, layout.radius(plot_data['dbh']),
+                 TREE_COLOR, TREE_ALPHA)
+    if relative:
+        px, py = layout.px(plot_data['xref_rel'], plot_data['yref_rel'])
+        draw_circles(canvas, px, py, layout.radius(REL_REF_AREA),
+                     REL_REF_COLOR)
+    px, py = layout.px([xy[0] for xy in refs.values()],
+                       [xy[1] for xy in refs.values()])
+    draw_circles(canvas, px, py, layout.radius(REF_AREA), REF_COLOR)
+    scale = max(1, int(round(12 * layout.pt / 7)))
+    for label, x, y in labels:
+        px, py = layout.px(x, y)
+        draw_text(canvas, label, px, py, LABEL_COLOR, scale)
+    m = int(MARGIN * size / 2)
+    frame = np.array(FRAME_COLOR, dtype=float) / 255
+    canvas[m, m:size - m] = canvas[size - m - 1, m:size - m] = frame
+    canvas[m:size - m, m] = canvas[m:size - m, size - m - 1] = frame
+    return encode_png((canvas * 255 + .5).astype(np.uint8))
+
+
+def save_map(output_file, h_refs, v_refs, refs, letters_abscissa, relative,
+             plot_data, size=MAP_SIZE):
+    """
+    Save the map of a plot as svg if output_file ends with '.svg', as png
+    else.
+    """
+    if output_file.lower().endswith('.svg'):
+        with open(output_file, 'w') as f:
+            f.write(map_svg(h_refs, v_refs, refs, letters_abscissa, relative,
+                            plot_data, size))
+    else:
+        with open(output_file, 'wb') as f:
+            f.write(map_png(h_refs, v_refs, refs, letters_abscissa, relative,
+                            plot_data, size))
+
+
+def save_atlas(output_file, maps, columns=4, tile_size=400):
+    """
+    Save an svg atlas of plot maps: maps is a list of (title, map file)
+    tuples, the map files (svg or png) being linked relatively to the
+    atlas location.
+    """
+    base = os.path.dirname(os.path.abspath(output_file))
+    rows = (len(maps) + columns - 1) // columns
+    title_height = 24
+    width = columns * tile_size
+    height = rows * (tile_size + title_height)
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" '
+           'xmlns:xlink="http://www.w3.org/1999/xlink" width="{0}" '
+           'height="{1}" viewBox="0 0 {0} {1}">'.format(width, height),
+           '<rect width="{}" height="{}" fill="#ffffff"/>'
+           .format(width, height)]
+    for k, (title, map_file) in enumerate(maps):
+        x = (k % columns) * tile_size
+        y = (k // columns) * (tile_size + title_height)
+        href = os.path.relpath(os.path.abspath(map_file), base)
+        href = href.replace(os.sep, '/')
+        out.append('<text x="{}" y="{}" font-family="sans-serif" '
+                   'font-size="16">{}</text>'
+                   .format(x + 8, y + title_height - 6, escape(title)))
+        out.append('<image x="{}" y="{}" width="{}" height="{}" '
+                   'xlink:href="{}"/>'
+                   .format(x, y + title_height, tile_size, tile_size,
+                           escape(href)))
+    out.append('</svg>')
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(out))
+
+
+def escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;') \
+        .replace('>', '&gt;').replace('"', '&quot;')
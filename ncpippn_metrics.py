@@ -0,0 +1,251 @@
+#!/usr/bin/python
+# coding: utf-8
+
+"""
+Stand metrics of compiled plots: basal area, tree and stem densities and
+dbh class histograms, per quadrat and per strata, computed with array
+grouping over the columns of ncpippn_compiler.compile_columns.
+"""
+
+import os
+import csv
+
+import numpy as np
+
+from ncpippn_compiler import compile_dbh_columns, CHUNK_SIZE
+from ncpippn_columnar import read_columnar
+
+
+# Lower bounds of the dbh classes, in cm.
+DBH_CLASSES = (0, 10, 20, 30, 40, 50, 60, 80, 100)
+
+QUADRAT_AREA = 100.
+PLOT_AREA = 10000.
+
+METRICS = ('trees', 'stems', 'basal_area', 'trees_ha', 'stems_ha',
+           'basal_area_ha', 'mean_dbh')
+
+
+def class_names(dbh_classes=DBH_CLASSES):
+    return ['dbh_{}_{}'.format(lo, hi) for lo, hi
+            in zip(dbh_classes, dbh_classes[1:])] + \
+        ['dbh_{}_'.format(dbh_classes[-1])]
+
+
+def text_codes(columns, name):
+    """
+    Dictionary encode a text column: return the codes of its rows into a
+    list of strings, ending with '' for the empty rows. The codes of a
+    ColumnarTable are used as they are.
+    """
+    if hasattr(columns, 'codes'):
+        strings = columns.strings(name).to_list()
+        codes = np.array(columns.codes(name), dtype=np.int64)
+    else:
+        table = {}
+        values = columns[name]
+        codes = np.fromiter(
+            (-1 if v is None else table.setdefault(v, len(table))
+             for v in values), dtype=np.int64, count=len(values)
+        )
+        strings = sorted(table, key=table.get)
+    codes[codes < 0] = len(strings)
+    return codes, strings + ['']
+
+
+def group_sums(codes, n_groups, values):
+    return np.bincount(codes, weights=values, minlength=n_groups)
+
+
+def metrics_table(keys, cells, n_classes, area):
+    """
+    Build a metrics table (a dict of columns) from the per group sums of
+    cells: trees, stems, basal_area, dbh_sum and the flattened histograms.
+    """
+    trees = cells['trees']
+    table = {
+        'key': keys,
+        'trees': trees.astype(np.int64),
+        'stems': cells['stems'].astype(np.int64),
+        'basal_area': cells['basal_area'],
+        'trees_ha': trees * 10000. / area,
+        'stems_ha': cells['stems'] * 10000. / area,
+        'basal_area_ha': cells['basal_area'] * 10000. / area,
+    }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['mean_dbh'] = np.where(trees > 0, cells['dbh_sum'] / trees,
+                                     np.nan)
+    return table
+
+
+def stand_metrics(columns, dbh_classes=DBH_CLASSES,
+                  quadrat_area=QUADRAT_AREA, plot_area=PLOT_AREA):
+    """
+    Compute the stand metrics of a compiled plot (a dict of columns, see
+    compile_columns, or a ColumnarTable), for its trees with a dbh. The
+    sums are computed once per (quadrat, strata) cell, and aggregated to
+    the quadrat, strata and plot levels. Return a dict with:
+
+    - 'quadrat': the table of the quadrats, keyed by quadrat;
+    - 'plot': the table of the strata, keyed by strata (-1 for an empty
+      strata), and a last row for the whole plot, keyed 'all'.
+
+    Each table is a dict of columns: 'key', METRICS (basal areas in m2,
+    densities per hectare, mean dbh in cm), and the number of trees in
+    each dbh class (see class_names).
+    """
+    dbh = np.asarray(columns['dbh'], dtype=float)
+    trees = np.isfinite(dbh) & (dbh > 0)
+    dbh = dbh[trees]
+    stratas = np.asarray(columns['strata'])[trees]
+    codes, strings = text_codes(columns, 'circumferences')
+    stem_counts = np.array([c.count(';') + 1 if c else 0 for c in strings])
+    stems = stem_counts[codes[trees]]
+
+    # Group the quadrats by code, sorted by name.
+    codes, strings = text_codes(columns, 'quadrat')
+    used, q_codes = np.unique(codes[trees], return_inverse=True)
+    q_keys = np.array(strings, dtype=object)[used]
+    rank = np.argsort(q_keys.astype(str), kind='mergesort')
+    q_keys = q_keys[rank]
+    q_codes = np.argsort(rank)[q_codes]
+    s_keys, s_codes = np.unique(stratas, return_inverse=True)
+    n_cells = len(q_keys) * len(s_keys)
+    cell_codes = q_codes * len(s_keys) + s_codes
+
+    n_classes = len(dbh_classes)
+    dbh_class = np.digitize(dbh, dbh_classes[1:])
+    hist = np.bincount(cell_codes * n_classes + dbh_class,
+                       minlength=n_cells * n_classes)
+    cells = {
+        'trees': group_sums(cell_codes, n_cells, None),
+        'stems': group_sums(cell_codes, n_cells, stems),
+        'basal_area': group_sums(cell_codes, n_cells,
+                                 np.pi * (dbh / 200.) ** 2),
+        'dbh_sum': group_sums(cell_codes, n_cells, dbh),
+        'hist': hist.reshape(n_cells, n_classes),
+    }
+    cells = dict((k, v.reshape((len(q_keys), len(s_keys)) + v.shape[1:]))
+                 for k, v in cells.items())
+
+    by_quadrat = dict((k, v.sum(axis=1)) for k, v in cells.items())
+    by_strata = dict((k, v.sum(axis=0)) for k, v in cells.items())
+    whole = dict((k, v.sum(axis=0)[np.newaxis]) for k, v
+                 in by_strata.items())
+
+    quadrat_table = metrics_table(q_keys, by_quadrat, n_classes,
+                                  quadrat_area)
+    plot_table = metrics_table(
+        np.concatenate([s_keys.astype(object), ['all']]),
+        dict((k, np.concatenate([by_strata[k], whole[k]]))
+             for k in by_strata),
+        n_classes, plot_area
+    )
+    names = class_names(dbh_classes)
+    for table, sums in ((quadrat_table, by_quadrat),
+                        (plot_table, {'hist': np.concatenate(
+                            [by_strata['hist'], whole['hist']])})):
+        for i, name in enumerate(names):
+            table[name] = sums['hist'][:, i].astype(np.int64)
+    return {'quadrat': quadrat_table, 'plot': plot_table}
+
+
+def metrics_header(table, key_name):
+    return ['plot', key_name] + [k for k in table if k != 'key']
+
+
+def metrics_rows(plot_name, table):
+    """
+    The csv rows of a metrics table, prefixed with the plot name.
+    """
+    names = [k for k in table if k != 'key']
+    for i, key in enumerate(table['key']):
+        yield [plot_name, key] + [
+            round(float(table[k][i]), 4) if table[k].dtype.kind == 'f'
+            else table[k][i] for k in names
+        ]
+
+
+def load_columns(path, chunk_size=CHUNK_SIZE):
+    """
+    Load the columns needed for the metrics, from a columnar file (see
+    ncpippn_columnar) or by computing the dbh of the trees of an easyplot
+    database, without positioning them (see compile_dbh_columns).
+    """
+    if path.endswith('.epdb'):
+        return compile_dbh_columns(path, chunk_size)
+    return read_columnar(path)
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+
+    description = \
+        """
+        NCPIPPN Metrics computes the stand metrics (basal area, tree and
+        stem densities, dbh class histograms) of compiled plots, per
+        quadrat and per strata, and writes them in the quadrat_metrics.csv
+        and plot_metrics.csv files of the output directory.
+        """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help="""
+            The plots: easyplot databases (.epdb), compiled on the fly, or
+            columnar files written with the --output_columnar option of
+            ncpippn_compiler.py
+            """
+    )
+    parser.add_argument(
+        'output_dir',
+        help="The output directory"
+    )
+    parser.add_argument(
+        '--dbh_classes',
+        type=float,
+        nargs='+',
+        default=list(DBH_CLASSES),
+        help="The lower bounds of the dbh classes, in cm"
+    )
+    parser.add_argument(
+        '--quadrat_area',
+        type=float,
+        default=QUADRAT_AREA,
+        help="The area of a quadrat, in m2"
+    )
+    parser.add_argument(
+        '--plot_area',
+        type=float,
+        default=PLOT_AREA,
+        help="The area of a plot, in m2"
+    )
+
+    args = parser.parse_args()
+
+    dbh_classes = tuple(int(c) if c == int(c) else c
+                        for c in args.dbh_classes)
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    with open(os.path.join(args.output_dir, 'quadrat_metrics.csv'), 'w') \
+            as quadrat_file, \
+            open(os.path.join(args.output_dir, 'plot_metrics.csv'), 'w') \
+            as plot_file:
+        quadrat_writer = csv.writer(quadrat_file)
+        plot_writer = csv.writer(plot_file)
+        for k, path in enumerate(args.inputs):
+            plot_name = os.path.splitext(os.path.basename(path))[0]
+            metrics = stand_metrics(load_columns(path), dbh_classes,
+                                    args.quadrat_area, args.plot_area)
+            if k == 0:
+                quadrat_writer.writerow(metrics_header(metrics['quadrat'],
+                                                       'quadrat'))
+                plot_writer.writerow(metrics_header(metrics['plot'],
+                                                    'strata'))
+            quadrat_writer.writerows(metrics_rows(plot_name,
+                                                  metrics['quadrat']))
+            plot_writer.writerows(metrics_rows(plot_name, metrics['plot']))
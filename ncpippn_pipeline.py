@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# coding: utf-8
+
+"""
+Asyncio pipeline compiling many plots, used by ncpippn_batch_compiler: the
+database reads and the csv/png writes run on a thread pool, the dbh and
+position computations on a process pool, with bounded queues between the
+stages, so the disks and the CPUs are busy at the same time across plots.
+"""
+
+import os
+import csv
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from ncpippn_compiler import easyplot_db_to_data_array, \
+    easyplot_db_to_reference_index, compile_rows, make_references, \
+    save_plot_png
+from ncpippn_batch_compiler import job_status, remove_job_outputs, \
+    check_job_outputs
+
+
+# Number of plots waiting between two stages.
+QUEUE_SIZE = 2
+
+
+def read_job(job):
+    """
+    I/O stage: load the rows and the reference index of a job database.
+    """
+    return (easyplot_db_to_data_array(job['database']),
+            easyplot_db_to_reference_index(job['database']))
+
+
+def compute_job(job, rows, index):
+    """
+    CPU stage: compile the rows of a job (see compile_rows).
+    """
+    return compile_rows(rows, index, job['plot_azimuth'],
+                        job['north_oriented'], job['relative'],
+                        job['letters_abscissa'], job['force_0_100_bounds'],
+                        bool(job['output_plot_png']))
+
+
+def write_job(job, d_rows, plot_data):
+    """
+    I/O stage: write the csv file, and the map, of a job. The csv is moved
+    over the output once complete.
+    """
+    tmp_csv_file = job['output_csv_file'] + '.tmp'
+    try:
+        with open(tmp_csv_file, 'w') as dest:
+            dest_writer = csv.writer(dest, delimiter=job['csv_separator'])
+            dest_writer.writerows(d_rows)
+        os.replace(tmp_csv_file, job['output_csv_file'])
+    finally:
+        if os.path.exists(tmp_csv_file):
+            os.remove(tmp_csv_file)
+    if job['output_plot_png']:
+        h_refs, v_refs, refs = make_references(job['plot_azimuth'],
+                                               job['north_oriented'],
+                                               job['letters_abscissa'])
+        save_plot_png(job['output_plot_png'], h_refs, v_refs, refs,
+                      job['letters_abscissa'], job['relative'], plot_data,
+                      job.get('plot_backend', 'builtin'))
+
+
+async def run_pipeline(jobs, processes, io_threads, queue_size):
+    loop = asyncio.get_event_loop()
+    statuses = [job_status(job) for job in jobs]
+    starts = {}
+    pending = asyncio.Queue()
+    for i, status in enumerate(statuses):
+        if status['status'] != 'skipped':
+            pending.put_nowait(i)
+    computing = asyncio.Queue(queue_size)
+    writing = asyncio.Queue(queue_size)
+
+    def fail(i, e):
+        statuses[i]['status'] = 'error'
+        statuses[i]['message'] = str(e)
+        remove_job_outputs(jobs[i], statuses[i])
+        statuses[i]['seconds'] = round(time.time() - starts[i], 3)
+
+    async def reader(io_executor):
+        while not pending.empty():
+            i = pending.get_nowait()
+            starts[i] = time.time()
+            try:
+                rows, index = await loop.run_in_executor(
+                    io_executor, read_job, jobs[i]
+                )
+            except Exception as e:
+                fail(i, e)
+                continue
+            await computing.put((i, rows, index))
+
+    async def computer(cpu_executor):
+        while True:
+            item = await computing.get()
+            if item is None:
+                return
+            i, rows, index = item
+            try:
+                d_rows, plot_data = await loop.run_in_executor(
+                    cpu_executor, compute_job, jobs[i], rows, index
+                )
+            except Exception as e:
+                fail(i, e)
+                continue
+            await writing.put((i, d_rows, plot_data))
+
+    async def writer(io_executor):
+        while True:
+            item = await writing.get()
+            if item is None:
+                return
+            i, d_rows, plot_data = item
+            try:
+                await loop.run_in_executor(io_executor, write_job, jobs[i],
+                                           d_rows, plot_data)
+            except Exception as e:
+                fail(i, e)
+                continue
+            statuses[i]['status'] = 'ok'
+            statuses[i]['seconds'] = round(time.time() - starts[i], 3)
+
+    with ThreadPoolExecutor(io_threads) as io_executor, \
+            ProcessPoolExecutor(processes) as cpu_executor:
+        readers = [reader(io_executor) for _ in range(io_threads)]
+        computers = [asyncio.ensure_future(computer(cpu_executor))
+                     for _ in range(processes)]
+        writers = [asyncio.ensure_future(writer(io_executor))
+                   for _ in range(io_threads)]
+        await asyncio.gather(*readers)
+        for _ in computers:
+            await computing.put(None)
+        await asyncio.gather(*computers)
+        for _ in writers:
+            await writing.put(None)
+        await asyncio.gather(*writers)
+    return statuses
+
+
+def pipeline_compile_batch(jobs, processes=None, io_threads=2,
+                           queue_size=QUEUE_SIZE):
+    """
+    Same as ncpippn_batch_compiler.compile_batch, through the asyncio
+    pipeline: each plot is read, compiled and written by a different stage,
+    the stages working on different plots at the same time. Each plot is
+    held in memory as a whole, and at most queue_size plots wait between
+    two stages. The jobs must have distinct outputs (see
+    ncpippn_batch_compiler.check_job_outputs).
+    """
+    if not jobs:
+        return []
+    check_job_outputs(jobs)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            run_pipeline(jobs, processes, io_threads, queue_size)
+        )
+    finally:
+        loop.close()
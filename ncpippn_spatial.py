@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# coding: utf-8
+
+"""
+Spatial index over the compiled tree positions: a uniform grid of square
+cells aligned on the 10 m reference grid, answering radius and k nearest
+neighbours queries without scanning every tree.
+"""
+
+import numpy as np
+
+
+CELL_SIZE = 10.
+
+
+class GridIndex(object):
+    """
+    Uniform grid index of points. The rows (positions in x and y) of the
+    points of each cell are stored contiguously in order, cells being
+    numbered row by row, and starts[c]:starts[c + 1] is the range of cell c
+    in order. Points with a NaN coordinate are not indexed.
+    """
+
+    def __init__(self, x, y, cell_size=CELL_SIZE, ids=None):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.cell_size = float(cell_size)
+        self.ids = None if ids is None else np.asarray(ids)
+        rows = np.flatnonzero(np.isfinite(self.x) & np.isfinite(self.y))
+        if len(rows):
+            # Align the grid on multiples of the cell size.
+            self.x0 = np.floor(self.x[rows].min() / cell_size) * cell_size
+            self.y0 = np.floor(self.y[rows].min() / cell_size) * cell_size
+            self.nx = int((self.x[rows].max() - self.x0) // cell_size) + 1
+            self.ny = int((self.y[rows].max() - self.y0) // cell_size) + 1
+        else:
+            self.x0 = self.y0 = 0.
+            self.nx = self.ny = 1
+        cells = self.cell_of(self.x[rows], self.y[rows])
+        sort = np.argsort(cells, kind='mergesort')
+        self.order = rows[sort]
+        self.starts = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.nx * self.ny),
+                  out=self.starts[1:])
+
+    def cell_of(self, x, y):
+        ix, iy = self.cell_xy(x, y)
+        return iy * self.nx + ix
+
+    def cell_xy(self, x, y):
+        ix = np.floor((np.asarray(x) - self.x0) / self.cell_size)
+        iy = np.floor((np.asarray(y) - self.y0) / self.cell_size)
+        return (np.clip(ix, 0, self.nx - 1).astype(np.int64),
+                np.clip(iy, 0, self.ny - 1).astype(np.int64))
+
+    def box_rows(self, x_min, y_min, x_max, y_max):
+        """
+        The rows of the points of the cells intersecting a box. The cells
+        of a grid row being contiguous in order, there is one slice per
+        grid row.
+        """
+        ix0, iy0 = self.cell_xy(x_min, y_min)
+        ix1, iy1 = self.cell_xy(x_max, y_max)
+        return np.concatenate([np.zeros(0, dtype=np.int64)] + [
+            self.order[self.starts[iy * self.nx + ix0]:
+                       self.starts[iy * self.nx + ix1 + 1]]
+            for iy in range(int(iy0), int(iy1) + 1)
+        ])
+
+    def radius(self, x, y, r):
+        """
+        The rows of the points within r of (x, y), sorted by distance, and
+        their distances.
+        """
+        rows = self.box_rows(x - r, y - r, x + r, y + r)
+        d = np.hypot(self.x[rows] - x, self.y[rows] - y)
+        keep = d <= r
+        rows, d = rows[keep], d[keep]
+        sort = np.argsort(d, kind='mergesort')
+        return rows[sort], d[sort]
+
+    def nearest(self, x, y, k):
+        """
+        The rows of the k nearest points of (x, y), sorted by distance, and
+        their distances. The search box grows a ring of cells at a time,
+        until it holds k points closer than its edges.
+        """
+        k = min(k, len(self.order))
+        span = self.cell_size
+        while True:
+            rows = self.box_rows(x - span, y - span, x + span, y + span)
+            d = np.hypot(self.x[rows] - x, self.y[rows] - y)
+            # The box covers at least span around (x, y), unless it is the
+            # whole grid.
+            whole = x - span <= self.x0 and y - span <= self.y0 and \
+                x + span >= self.x0 + self.nx * self.cell_size and \
+                y + span >= self.y0 + self.ny * self.cell_size
+            if len(rows) >= k:
+                sort = np.argsort(d, kind='mergesort')[:k]
+                if whole or k == 0 or d[sort[-1]] <= span:
+                    return rows[sort], d[sort]
+            elif whole:
+                sort = np.argsort(d, kind='mergesort')
+                return rows[sort], d[sort]
+            span += self.cell_size
+
+    def neighbours(self, row, r):
+        """
+        The rows of the other points within r of the point of a row, sorted
+        by distance, and their distances.
+        """
+        rows, d = self.radius(self.x[row], self.y[row], r)
+        keep = rows != row
+        return rows[keep], d[keep]
+
+    def save(self, path):
+        """
+        Save the index in a .npz file.
+        """
+        arrays = {
+            'x': self.x, 'y': self.y, 'order': self.order,
+            'starts': self.starts,
+            'grid': np.array([self.cell_size, self.x0, self.y0, self.nx,
+                              self.ny]),
+        }
+        if self.ids is not None:
+            arrays['ids'] = self.ids.astype(str)
+        np.savez(path, **arrays)
+
+
+def load_grid_index(path):
+    """
+    Load an index saved with GridIndex.save.
+    """
+    data = np.load(path)
+    index = GridIndex.__new__(GridIndex)
+    index.x, index.y = data['x'], data['y']
+    index.order, index.starts = data['order'], data['starts']
+    cell_size, index.x0, index.y0, nx, ny = data['grid']
+    index.cell_size, index.nx, index.ny = cell_size, int(nx), int(ny)
+    index.ids = data['ids'] if 'ids' in data.files else None
+    return index
+
+
+def columns_grid_index(columns, cell_size=CELL_SIZE):
+    """
+    Build the index of the positioned rows of a compiled table (a dict of
+    columns, see ncpippn_compiler.compile_columns).
+    """
+    return GridIndex(columns['x'], columns['y'], cell_size, columns['id'])
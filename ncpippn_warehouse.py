@@ -0,0 +1,313 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import os
+import time
+import sqlite3
+import multiprocessing
+
+from ncpippn_compiler import iter_compile, CHUNK_SIZE
+from ncpippn_batch_compiler import parse_bool, jobs_from_directory, \
+    jobs_from_manifest
+
+
+WAREHOUSE_SCHEMA = \
+    """
+    CREATE TABLE IF NOT EXISTS plot (
+        plot_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        database TEXT,
+        plot_azimuth REAL,
+        north_oriented INTEGER,
+        relative INTEGER,
+        letters_abscissa INTEGER,
+        force_0_100_bounds INTEGER,
+        trees INTEGER,
+        loaded_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS tree (
+        plot_id INTEGER NOT NULL REFERENCES plot (plot_id),
+        id TEXT NOT NULL,
+        quadrat TEXT,
+        strata INTEGER,
+        circumferences TEXT,
+        dbh REAL,
+        height REAL,
+        reference TEXT,
+        hdist REAL,
+        azimuth REAL,
+        x REAL,
+        y REAL
+    );
+    """
+
+# Indexes of the tree table, built once the trees are loaded. The first
+# one is kept while loading into a non empty warehouse, for replacing the
+# plots loaded again.
+TREE_INDEXES = (
+    ('tree_plot', 'plot_id, id'),
+    ('tree_quadrat', 'plot_id, quadrat'),
+    ('tree_strata', 'strata'),
+    ('tree_dbh', 'dbh'),
+)
+
+# Number of compiled rows inserted at a time.
+INSERT_BATCH_SIZE = 10000
+
+
+def drop_tree_indexes(connection):
+    empty = connection.execute(
+        "SELECT NOT EXISTS (SELECT 1 FROM tree);"
+    ).fetchone()[0]
+    for name, _ in TREE_INDEXES[0 if empty else 1:]:
+        connection.execute("DROP INDEX IF EXISTS {};".format(name))
+
+
+def create_tree_indexes(connection):
+    for name, columns in TREE_INDEXES:
+        connection.execute("CREATE INDEX IF NOT EXISTS {} ON tree ({});"
+                           .format(name, columns))
+    connection.execute("ANALYZE;")
+
+
+def compile_job_rows(job):
+    """
+    Compile the database of a job and return (rows, error), rows being the
+    list of the compiled rows, or None if the compilation failed.
+    """
+    try:
+        rows = [d_row for d_rows in
+                iter_compile(job['database'], job['plot_azimuth'],
+                             job['north_oriented'], job['relative'],
+                             job['letters_abscissa'],
+                             job['force_0_100_bounds'], job['chunk_size'])
+                for d_row in d_rows]
+        return rows, None
+    except Exception as e:
+        return None, str(e)
+
+
+def plot_name(job):
+    """
+    The name of the plot of a job in the warehouse, which identifies it:
+    its 'plot' column in the manifest, else the normalized full path of its
+    database, so same-named databases of different directories are
+    different plots.
+    """
+    if job.get('plot'):
+        return job['plot']
+    return os.path.normcase(os.path.realpath(job['database']))
+
+
+def check_plot_names(jobs):
+    """
+    Raise a ValueError listing the plot names (see plot_name) shared by
+    several jobs, if any.
+    """
+    seen = set()
+    duplicates = []
+    for job in jobs:
+        name = plot_name(job)
+        if name in seen and name not in duplicates:
+            duplicates.append(name)
+        seen.add(name)
+    if duplicates:
+        raise ValueError("Duplicate plots: {}.".format(', '.join(duplicates)))
+
+
+def load_plot(connection, job, rows):
+    """
+    Load the compiled rows of a plot in the warehouse, in a single
+    transaction, replacing the plot if it was already loaded (under the
+    same name, or from the same database). Return its plot_id.
+    """
+    name = plot_name(job)
+    database = os.path.abspath(job['database'])
+    with connection:
+        cur = connection.cursor()
+        cur.execute("SELECT plot_id FROM plot WHERE name = ? "
+                    "OR database = ?;", (name, database))
+        for found in cur.fetchall():
+            cur.execute("DELETE FROM tree WHERE plot_id = ?;", found)
+            cur.execute("DELETE FROM plot WHERE plot_id = ?;", found)
+        cur.execute(
+            "INSERT INTO plot (name, database, plot_azimuth, north_oriented, "
+            "relative, letters_abscissa, force_0_100_bounds, trees, "
+            "loaded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'));",
+            (name, database, job['plot_azimuth'],
+             job['north_oriented'], job['relative'], job['letters_abscissa'],
+             job['force_0_100_bounds'], len(rows))
+        )
+        plot_id = cur.lastrowid
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            cur.executemany(
+                "INSERT INTO tree VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                [(plot_id,) + tuple(row)
+                 for row in rows[i:i + INSERT_BATCH_SIZE]]
+            )
+    return plot_id
+
+
+def load_warehouse(warehouse, jobs, processes=None):
+    """
+    Compile the databases of the jobs over a pool of processes and load
+    them in the warehouse database, creating it if needed. The tree
+    indexes are dropped during the load and built again afterwards (see
+    TREE_INDEXES). The plots must have distinct names (see
+    check_plot_names). Return the status of each plot, in the order of the
+    jobs.
+    """
+    check_plot_names(jobs)
+    connection = sqlite3.connect(warehouse)
+    statuses = []
+    try:
+        connection.executescript(WAREHOUSE_SCHEMA)
+        drop_tree_indexes(connection)
+        pool = multiprocessing.Pool(processes)
+        try:
+            start = time.time()
+            for job, (rows, error) in zip(
+                    jobs, pool.imap(compile_job_rows, jobs, chunksize=1)):
+                status = {'database': job['database'], 'trees': None,
+                          'status': 'error', 'message': error}
+                if rows is not None:
+                    try:
+                        load_plot(connection, job, rows)
+                        status['status'] = 'ok'
+                        status['trees'] = len(rows)
+                    except sqlite3.Error as e:
+                        status['message'] = str(e)
+                status['seconds'] = round(time.time() - start, 3)
+                start = time.time()
+                statuses.append(status)
+        finally:
+            pool.close()
+            pool.join()
+            create_tree_indexes(connection)
+            connection.commit()
+    finally:
+        connection.close()
+    return statuses
+
+
+if __name__ == '__main__':
+
+    import sys
+    import argparse
+
+
+    def str2bool(v):
+        try:
+            return parse_bool(v)
+        except ValueError:
+            raise argparse.ArgumentTypeError('Boolean value expected.')
+
+    description = \
+        """
+        NCPIPPN Warehouse compiles many easyplot databases and loads the
+        results in a single SQLite database, with a plot table and a tree
+        table indexed by plot, quadrat, strata and dbh, for querying across
+        plots. A plot loaded again replaces the previous load.
+        """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'input',
+        help="""
+            A directory containing .epdb databases, or a csv manifest with
+            the 'database' and 'plot_azimuth' columns, and optionally one
+            column per boolean option.
+            """
+    )
+    parser.add_argument(
+        'warehouse',
+        help="The warehouse database, created if it does not exist"
+    )
+    parser.add_argument(
+        '--plot_azimuth',
+        type=float,
+        default=None,
+        help="The plot azimuth (float), required with a directory input"
+    )
+    parser.add_argument(
+        '--north_oriented',
+        type=str2bool,
+        default=False,
+        help="""
+            Compute the x, y coordinates in the north oriented
+            coordinate system (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--relative',
+        type=str2bool,
+        default=False,
+        help="""
+            Compute the x, y coordinates in the north oriented using the
+            relative positioning of the references (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--letters_abscissa',
+        type=str2bool,
+        default=False,
+        help="""
+            If True, A0 -> K0 is considered as the abscissa. Else, A0 -> A10
+            is considered as the abscissa. (boolean: True/False).
+            """
+    )
+    parser.add_argument(
+        '--force_0_100_bounds',
+        type=str2bool,
+        default=True,
+        help="""
+            If True, the script will set negative tree position values to 0
+            and those exceeding 100 to 100.
+            """
+    )
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=CHUNK_SIZE,
+        help="The number of rows read and compiled at a time."
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="The number of worker processes (default: the number of CPUs)"
+    )
+
+    args = parser.parse_args()
+
+    options = {
+        'output_plot_png': False,
+        'north_oriented': args.north_oriented,
+        'relative': args.relative,
+        'letters_abscissa': args.letters_abscissa,
+        'force_0_100_bounds': args.force_0_100_bounds,
+        'chunk_size': args.chunk_size,
+    }
+
+    # The jobs outputs are not used, only their compile options.
+    if os.path.isdir(args.input):
+        if args.plot_azimuth is None:
+            parser.error("--plot_azimuth is required with a directory input")
+        jobs = jobs_from_directory(args.input, args.plot_azimuth, '',
+                                   options)
+    else:
+        jobs = jobs_from_manifest(args.input, '', options)
+
+    try:
+        statuses = load_warehouse(args.warehouse, jobs, args.processes)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    for status in statuses:
+        if status['status'] != 'ok':
+            print("{}: {}".format(status['database'], status['message']))
+    print("{} of {} plots loaded in {} ({} trees)."
+          .format(sum(1 for s in statuses if s['status'] == 'ok'),
+                  len(statuses), args.warehouse,
+                  sum(s['trees'] or 0 for s in statuses)))
@@ -0,0 +1,60 @@
+# coding: utf-8
+
+import os
+import sys
+import random
+import sqlite3
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from easyplot_generator import generate_easyplot_dabatase, \
+    generate_references
+
+
+def make_plot(path, trees=200, seed=1):
+    """
+    Generate an easyplot database with trees random trees: the fixed
+    references are chained from A0 (for the relative mode), and about a
+    third of the trees use another tree as reference.
+    """
+    generate_easyplot_dabatase(path, 1, trees)
+    rnd = random.Random(seed)
+    refs = generate_references()
+    c = sqlite3.connect(path)
+    for prev, ref in zip(refs, refs[1:]):
+        c.execute("UPDATE ncpippn SET reference = ?, hdist = ?, azimuth = ? "
+                  "WHERE id = ?;", (prev, 10., rnd.uniform(0, 360), ref))
+    for k in range(1, trees + 1):
+        circs = ';'.join('{:.1f}'.format(rnd.uniform(10, 200))
+                         for _ in range(rnd.randint(1, 3)))
+        if k > 10 and rnd.random() < 0.3:
+            ref = str(rnd.randint(1, k - 1))
+        else:
+            ref = rnd.choice(refs)
+        c.execute("UPDATE ncpippn SET quadrat = ?, strata = ?, "
+                  "circumferences = ?, height = ?, reference = ?, hdist = ?, "
+                  "azimuth = ? WHERE id = ?;",
+                  (rnd.choice(refs), rnd.randint(0, 4), circs,
+                   rnd.uniform(2, 30), ref, rnd.uniform(0, 8),
+                   rnd.uniform(0, 360), str(k)))
+    c.commit()
+    c.close()
+    return path
+
+
+def set_rows(path, column, values):
+    """
+    Set a column of some rows of a database: values maps ids to values.
+    """
+    c = sqlite3.connect(path)
+    c.executemany("UPDATE ncpippn SET {} = ? WHERE id = ?;".format(column),
+                  [(v, k) for k, v in values.items()])
+    c.commit()
+    c.close()
+
+
+@pytest.fixture
+def plot_db(tmp_path):
+    return make_plot(str(tmp_path / 'plot.epdb'))
@@ -0,0 +1,79 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+import ncpippn_batch_compiler as batch
+
+from conftest import make_plot, set_rows
+
+
+JOB_OPTIONS = {
+    'north_oriented': False, 'relative': False,
+    'letters_abscissa': False, 'force_0_100_bounds': True,
+    'output_plot_png': True, 'plot_format': 'svg', 'csv_separator': ',',
+    'overwrite': False, 'chunk_size': 50,
+}
+
+
+def make_job(database, output_dir, **options):
+    job_options = dict(JOB_OPTIONS)
+    job_options.update(options)
+    return batch.make_job(database, 30, output_dir, job_options)
+
+
+def test_failed_job_leaves_no_output(plot_db, tmp_path):
+    set_rows(plot_db, 'circumferences', {'7': '3;'})
+    job = make_job(plot_db, str(tmp_path))
+    assert batch.run_job(job)['status'] == 'error'
+    assert not os.path.exists(job['output_csv_file'])
+    assert not os.path.exists(job['output_plot_png'])
+
+    # Fixed, the plot is compiled on the next run, not skipped.
+    set_rows(plot_db, 'circumferences', {'7': '3'})
+    assert batch.run_job(job)['status'] == 'ok'
+    assert batch.run_job(job)['status'] == 'skipped'
+
+
+def test_empty_or_missing_output_is_not_done(plot_db, tmp_path):
+    job = make_job(plot_db, str(tmp_path))
+    open(job['output_csv_file'], 'w').close()
+    assert batch.run_job(job)['status'] == 'ok'
+    os.remove(job['output_plot_png'])
+    assert batch.run_job(job)['status'] == 'ok'
+    assert os.path.getsize(job['output_csv_file']) > 0
+
+
+def test_pipeline_failed_job_leaves_no_output(plot_db, tmp_path):
+    import ncpippn_pipeline
+    set_rows(plot_db, 'circumferences', {'7': '3;'})
+    job = make_job(plot_db, str(tmp_path))
+    statuses = ncpippn_pipeline.pipeline_compile_batch([job], processes=1)
+    assert statuses[0]['status'] == 'error'
+    assert not os.path.exists(job['output_csv_file'])
+
+
+def test_same_named_databases(tmp_path):
+    manifest = str(tmp_path / 'manifest.csv')
+    for site in ('site1', 'site2'):
+        os.mkdir(str(tmp_path / site))
+        make_plot(str(tmp_path / site / 'p1.epdb'), trees=50)
+    output_dir = str(tmp_path / 'out')
+    os.mkdir(output_dir)
+
+    with open(manifest, 'w') as f:
+        f.write("database,plot_azimuth\nsite1/p1.epdb,30\nsite2/p1.epdb,30\n")
+    jobs = batch.jobs_from_manifest(manifest, output_dir, JOB_OPTIONS)
+    with pytest.raises(ValueError, match='p1.csv'):
+        batch.compile_batch(jobs, processes=1)
+    assert os.listdir(output_dir) == []
+
+    with open(manifest, 'w') as f:
+        f.write("database,plot_azimuth,plot\n"
+                "site1/p1.epdb,30,site1_p1\nsite2/p1.epdb,30,site2_p1\n")
+    jobs = batch.jobs_from_manifest(manifest, output_dir, JOB_OPTIONS)
+    statuses = batch.compile_batch(jobs, processes=1)
+    assert [s['status'] for s in statuses] == ['ok', 'ok']
+    assert sorted(os.listdir(output_dir)) == \
+        ['site1_p1.csv', 'site1_p1.svg', 'site2_p1.csv', 'site2_p1.svg']
@@ -0,0 +1,16 @@
+# coding: utf-8
+
+import os
+
+import ncpippn_benchmark as benchmark
+
+
+def test_benchmark_compiles_every_row(tmp_path):
+    work_dir = str(tmp_path / 'missing' / 'work')
+    results = benchmark.run_benchmark([300], ['plot', 'relative'], work_dir,
+                                      chunk_size=50)
+    assert [r['mode'] for r in results] == ['plot', 'relative']
+    for result in results:
+        assert result['counters']['rows_compiled'] >= 300
+        assert set(benchmark.STAGES) <= set(result['seconds'])
+    assert os.listdir(work_dir) == []
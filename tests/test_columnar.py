@@ -0,0 +1,27 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+import ncpippn_compiler as compiler
+from ncpippn_columnar import read_columnar
+
+from test_compiler import compile_csv
+
+
+def test_columnar_round_trip(plot_db, tmp_path):
+    output = str(tmp_path / 'out.ncol')
+    compile_csv(plot_db, str(tmp_path / 'out.csv'), output_columnar=output)
+    columns = compiler.compile_columns(plot_db, 30)
+    table = read_columnar(output)
+    assert len(table) == len(columns['id'])
+    for name in compiler.COLUMNS:
+        if name in compiler.STR_COLUMNS:
+            assert list(table[name]) == \
+                [v if v != '' else None for v in columns[name]]
+        else:
+            np.testing.assert_array_equal(table[name], columns[name])
+    for i in (0, 57, len(table) - 1):
+        assert table.row(columns['id'][i]) == i
+    with pytest.raises(KeyError):
+        table.row('missing')
@@ -0,0 +1,209 @@
+# coding: utf-8
+
+import os
+import sqlite3
+
+import pytest
+
+import ncpippn_compiler as compiler
+
+from conftest import set_rows
+
+
+def compile_csv(database, output, **options):
+    args = dict(csv_delimiter=',', plot_azimuth=30, output_plot_png=None,
+                north_oriented=False, relative=False, letters_abscissa=False,
+                force_0_100_bounds=True)
+    args.update(options)
+    compiler.compile_data(database, output, **args)
+    with open(output) as f:
+        return f.read()
+
+
+def test_failed_compile_keeps_previous_output(plot_db, tmp_path):
+    output = str(tmp_path / 'out.csv')
+    previous = compile_csv(plot_db, output)
+    set_rows(plot_db, 'circumferences', {'5': '3;'})
+    with pytest.raises(ValueError, match="id '5'"):
+        compile_csv(plot_db, output)
+    with open(output) as f:
+        assert f.read() == previous
+    assert sorted(os.listdir(str(tmp_path))) == ['out.csv', 'plot.epdb']
+
+
+@pytest.mark.parametrize('shards', [None, 3])
+def test_failed_compile_writes_nothing(plot_db, tmp_path, shards):
+    set_rows(plot_db, 'circumferences', {'5': '1,5'})
+    output = str(tmp_path / 'out.csv')
+    with pytest.raises(ValueError, match="id '5'"):
+        if shards is None:
+            compile_csv(plot_db, output)
+        else:
+            compiler.sharded_compile_data(plot_db, output, ',', 30, None,
+                                          False, False, False, True,
+                                          shards=shards, processes=1)
+    assert os.listdir(str(tmp_path)) == ['plot.epdb']
+
+
+def test_columns_empty_strata(plot_db):
+    # The device writes '' in the empty columns.
+    set_rows(plot_db, 'strata', {'3': '', '4': None})
+    set_rows(plot_db, 'height', {'3': ''})
+    columns = compiler.compile_columns(plot_db, 30)
+    row = dict((v, i) for i, v in enumerate(columns['id']))
+    assert columns['strata'].dtype.kind == 'i'
+    assert columns['strata'][row['3']] == -1
+    assert columns['strata'][row['4']] == -1
+    assert columns['strata'][row['5']] >= 0
+    assert columns['height'][row['3']] != columns['height'][row['3']]
+
+
+def test_cache_key_depends_on_version(plot_db, monkeypatch):
+    args = (plot_db, ',', 30, False, False, False, True)
+    key = compiler.compile_cache_key(*args)
+    assert compiler.compile_cache_key(*args) == key
+    monkeypatch.setattr(compiler, 'CACHE_VERSION', compiler.CACHE_VERSION + 1)
+    assert compiler.compile_cache_key(*args) != key
+
+
+def test_summary_reports_malformed_circumferences(plot_db):
+    summary = compiler.summary_report(plot_db, 'strata')
+    assert sum(row[1] for row in summary) == 200
+    set_rows(plot_db, 'circumferences', {'5': '3;', '9': '1,5'})
+    with pytest.raises(ValueError) as e:
+        compiler.summary_report(plot_db, 'strata')
+    with pytest.raises(ValueError) as expected:
+        compiler.check_circumferences(plot_db)
+    assert str(e.value) == str(expected.value)
+    assert "id '5'" in str(e.value) and "id '9'" in str(e.value)
+
+
+def test_reference_cycle(plot_db, tmp_path):
+    # 30 depends on the cycle, and is itself used as a reference by 31.
+    set_rows(plot_db, 'reference', {'20': '21', '21': '22', '22': '20',
+                                    '30': '21', '31': '30'})
+    index = compiler.easyplot_db_to_reference_index(plot_db)
+    assert compiler.find_reference_cycle('20', index) == \
+        ['20', '21', '22', '20']
+    assert compiler.find_reference_cycle('30', index) == \
+        ['21', '22', '20', '21']
+    refs = compiler.make_references(30, False, False)[2]
+    resolved, unresolved = compiler.resolve_reference_graph(
+        index, refs, compiler.reference_dbhs(index), 30, False
+    )
+    for i in ('20', '21', '22', '30'):
+        assert 'reference cycle' in unresolved[i]
+        assert i not in resolved
+    with pytest.raises(ValueError, match='reference cycle'):
+        compile_csv(plot_db, str(tmp_path / 'out.csv'))
+    assert os.listdir(str(tmp_path)) == ['plot.epdb']
+
+
+@pytest.mark.parametrize('north_oriented,relative',
+                         [(False, False), (True, False), (True, True)])
+def test_incremental_compile_matches_full_compile(plot_db, tmp_path,
+                                                  north_oriented, relative):
+    options = dict(north_oriented=north_oriented, relative=relative)
+    incremental = str(tmp_path / 'incremental.csv')
+    full = str(tmp_path / 'full.csv')
+    assert compile_csv(plot_db, incremental, incremental=True, **options) \
+        == compile_csv(plot_db, full, **options)
+    # A moved reference tree moves the trees positioned from it.
+    index = compiler.easyplot_db_to_reference_index(plot_db)
+    moved = sorted(i for i in index if i[0].isdigit())[0]
+    set_rows(plot_db, 'hdist', {moved: 7.5})
+    set_rows(plot_db, 'circumferences', {'150': '42.0;17.5'})
+    assert compile_csv(plot_db, incremental, incremental=True, **options) \
+        == compile_csv(plot_db, full, **options)
+    # A removed tree, and a tree positioned from another reference.
+    with sqlite3.connect(plot_db) as connection:
+        leaves = [i for i, in connection.execute(
+            "SELECT id FROM ncpippn WHERE reference != '' AND id NOT IN "
+            "(SELECT reference FROM ncpippn WHERE reference IS NOT NULL) "
+            "ORDER BY rowid;"
+        )]
+        connection.execute("DELETE FROM ncpippn WHERE id = ?;", (leaves[0],))
+    set_rows(plot_db, 'reference', {leaves[1]: moved})
+    assert compile_csv(plot_db, incremental, incremental=True, **options) \
+        == compile_csv(plot_db, full, **options)
+
+
+@pytest.mark.parametrize('north_oriented,relative',
+                         [(False, False), (True, False), (True, True)])
+def test_sharded_compile_matches_single_compile(plot_db, tmp_path,
+                                                north_oriented, relative):
+    single = compile_csv(plot_db, str(tmp_path / 'single.csv'),
+                         north_oriented=north_oriented, relative=relative)
+    output = str(tmp_path / 'sharded.csv')
+    compiler.sharded_compile_data(plot_db, output, ',', 30, None,
+                                  north_oriented, relative, False, True,
+                                  chunk_size=17, shards=4, processes=2)
+    with open(output) as f:
+        assert f.read() == single
+
+
+@pytest.mark.parametrize('empty', [None, ''])
+def test_unpositioned_reference_tree(plot_db, tmp_path, empty):
+    # The device writes '' in the empty columns.
+    set_rows(plot_db, 'reference', {'40': empty, '41': '40'})
+    with pytest.raises(ValueError,
+                       match="The reference '40' had not been positioned."):
+        compile_csv(plot_db, str(tmp_path / 'out.csv'))
+
+
+def test_summary_leaves_out_blank_ids(plot_db, tmp_path):
+    from easyplot_generator import generate_easyplot_dabatase
+    blank = str(tmp_path / 'blank.epdb')
+    generate_easyplot_dabatase(blank, 1, 2000)
+    assert compiler.summary_report(blank, 'quadrat') == []
+
+    # Blank generated ids after the trees of the plot.
+    c = sqlite3.connect(plot_db)
+    c.executemany("INSERT INTO ncpippn (id, strata, circumferences) "
+                  "VALUES (?, '', '');", [(str(i),) for i in range(201, 301)])
+    c.commit()
+    c.close()
+    summary = compiler.summary_report(plot_db, 'strata')
+    assert sum(row[1] for row in summary) == 200
+    assert sum(row[3] for row in summary) == 200
+    assert '' not in [row[0] for row in summary]
+
+
+def dump(path):
+    c = sqlite3.connect(path)
+    try:
+        return list(c.iterdump())
+    finally:
+        c.close()
+
+
+def test_write_back(plot_db, tmp_path):
+    output = str(tmp_path / 'out.csv')
+    compiled = compile_csv(plot_db, output, write_back_db=True)
+    columns = compiler.compile_columns(plot_db, 30)
+    c = sqlite3.connect(plot_db)
+    stored = dict((r[0], r[1:]) for r in
+                  c.execute("SELECT id, dbh, x, y FROM ncpippn;"))
+    parameters = dict(c.execute("SELECT parameter, value FROM compilation;"))
+    c.close()
+    for i, row_id in enumerate(columns['id']):
+        dbh, x, y = stored[row_id]
+        assert (dbh is None) == (columns['dbh'][i] != columns['dbh'][i])
+        if dbh is not None:
+            assert dbh == columns['dbh'][i]
+        assert (x, y) == (columns['x'][i], columns['y'][i])
+    assert parameters['plot_azimuth'] == '30'
+
+    # The written back values do not change the next compilation.
+    assert compile_csv(plot_db, output, write_back_db=True) == compiled
+
+    # A failed compilation leaves the database unchanged, even when it
+    # fails after some chunks were compiled.
+    set_rows(plot_db, 'x', {'3': None})
+    set_rows(plot_db, 'reference', {'190': 'missing'})
+    before = dump(plot_db)
+    with pytest.raises(ValueError, match="'missing' does not exist"):
+        compile_csv(plot_db, output, write_back_db=True, chunk_size=20)
+    assert dump(plot_db) == before
+    with open(output) as f:
+        assert f.read() == compiled
@@ -0,0 +1,97 @@
+# coding: utf-8
+
+import sqlite3
+
+import pytest
+
+import easyplot_generator as generator
+from easyplot_upgrade import upgrade_databases, optimize_easyplot_database
+
+
+def read_ids(path):
+    c = sqlite3.connect(path)
+    try:
+        return [r[0] for r in c.execute("SELECT id FROM ncpippn "
+                                        "ORDER BY rowid;")]
+    finally:
+        c.close()
+
+
+def test_optimized_database_keeps_rowid_order(tmp_path):
+    path = str(tmp_path / 'o.epdb')
+    generator.generate_easyplot_dabatase(path, 1, 20,
+                                         schema=generator.OPTIMIZED_SCHEMA)
+    ids = read_ids(path)
+    assert ids == generator.generate_references() + \
+        [str(i) for i in range(1, 21)]
+    c = sqlite3.connect(path)
+    try:
+        assert generator.is_optimized(c)
+        # The device reads the table without any rowid-less layout.
+        c.execute("SELECT rowid FROM ncpippn LIMIT 1;")
+    finally:
+        c.close()
+
+
+def test_upgrade_writes_a_copy(plot_db, tmp_path):
+    with open(plot_db, 'rb') as f:
+        original = f.read()
+    output_dir = tmp_path / 'up'
+    output_dir.mkdir()
+    statuses = upgrade_databases([plot_db], str(output_dir))
+    assert [s[2] for s in statuses] == ['upgraded']
+    with open(plot_db, 'rb') as f:
+        assert f.read() == original
+    copy = statuses[0][1]
+    assert read_ids(copy) == read_ids(plot_db)
+    c = sqlite3.connect(copy)
+    try:
+        assert generator.is_optimized(c)
+    finally:
+        c.close()
+    assert [s[2] for s in upgrade_databases([plot_db], str(output_dir))] \
+        == ['skipped']
+
+    # An already optimized database is copied as it is.
+    output_dir = tmp_path / 'up2'
+    output_dir.mkdir()
+    statuses = upgrade_databases([copy], str(output_dir))
+    assert [s[2] for s in statuses] == ['optimized']
+    with open(copy, 'rb') as f, open(statuses[0][1], 'rb') as g:
+        assert f.read() == g.read()
+
+
+def test_upgrade_refuses_in_place(plot_db):
+    with pytest.raises(ValueError):
+        optimize_easyplot_database(plot_db, plot_db)
+
+
+def test_generate_from_template(tmp_path):
+    template = generator.make_template(str(tmp_path / 'template.epdb'))
+    path = str(tmp_path / 'p.epdb')
+    generator.generate_easyplot_dabatase(path, 5, 30, template)
+    assert read_ids(path) == generator.generate_references() + \
+        [str(i) for i in range(5, 31)]
+    # The template is left as it was.
+    assert read_ids(template) == generator.generate_references()
+
+
+def test_campaign_regenerates_failed_databases(tmp_path):
+    from easyplot_campaign import generate_campaign
+    plots = [{'plot': 'p{}'.format(k), 'start_id': 100 * k + 1,
+              'end_id': 100 * k + 100, 'overwrite': False,
+              'database': str(tmp_path / 'p{}.epdb'.format(k))}
+             for k in range(3)]
+    generate_campaign(plots, processes=1)
+    with open(plots[1]['database'], 'wb') as f:
+        f.write(b'partial')
+    c = sqlite3.connect(plots[2]['database'])
+    c.execute("DELETE FROM ncpippn WHERE id = '250';")
+    c.commit()
+    c.close()
+
+    statuses = generate_campaign(plots, processes=1)
+    assert [s['status'] for s in statuses] == ['skipped', 'ok', 'ok']
+    for plot in plots:
+        generator.verify_easyplot_database(plot['database'], plot['start_id'],
+                                           plot['end_id'])
@@ -0,0 +1,32 @@
+# coding: utf-8
+
+import sqlite3
+
+import pytest
+
+from easyplot.fill_db import make_ncpippn_db
+
+HEADER = ';'.join('c{}'.format(i) for i in range(20))
+
+
+def write_csv(path, stratas):
+    with open(path, 'w') as f:
+        f.write(HEADER + '\n')
+        for i, strata in enumerate(stratas, 1):
+            row = [''] * 20
+            row[1], row[5], row[6], row[19] = str(i), strata, '12,5', 'sp'
+            f.write(';'.join(row) + '\n')
+
+
+def test_failed_import_leaves_no_table(tmp_path):
+    csv_path, db_path = str(tmp_path / 'p.csv'), str(tmp_path / 'p.db')
+    write_csv(csv_path, ['canopee'] * 5 + ['unknown'])
+    with pytest.raises(ValueError):
+        make_ncpippn_db(csv_path, db_path, batch_size=2)
+    c = sqlite3.connect(db_path)
+    assert c.execute("SELECT name FROM sqlite_master;").fetchall() == []
+    c.close()
+
+    # Fixed, the import can be run again.
+    write_csv(csv_path, ['canopee'] * 6)
+    assert make_ncpippn_db(csv_path, db_path, batch_size=2) == 6
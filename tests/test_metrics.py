@@ -0,0 +1,28 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+import ncpippn_compiler as compiler
+from ncpippn_metrics import stand_metrics, load_columns
+
+from conftest import set_rows
+
+
+def test_dbh_columns_match_compiled_columns(plot_db):
+    compiled = compiler.compile_columns(plot_db, 30)
+    columns = compiler.compile_dbh_columns(plot_db, chunk_size=17)
+    assert list(columns['id']) == list(compiled['id'])
+    np.testing.assert_array_equal(columns['dbh'], compiled['dbh'])
+    np.testing.assert_array_equal(columns['strata'], compiled['strata'])
+
+
+def test_metrics_without_positions(plot_db):
+    before = stand_metrics(load_columns(plot_db))
+    set_rows(plot_db, 'reference', {'12': '280'})
+    with pytest.raises(ValueError, match="'280'"):
+        compiler.compile_columns(plot_db, 30)
+    after = stand_metrics(load_columns(plot_db))
+    for level in ('quadrat', 'plot'):
+        for k in before[level]:
+            np.testing.assert_array_equal(before[level][k], after[level][k])
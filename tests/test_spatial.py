@@ -0,0 +1,73 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+import ncpippn_compiler as compiler
+from ncpippn_spatial import columns_grid_index, load_grid_index
+
+from test_compiler import compile_csv
+
+
+@pytest.fixture
+def columns(plot_db):
+    # Without the 0-100 bounds, fewer trees share a position.
+    return compiler.compile_columns(plot_db, 30, relative=True,
+                                    north_oriented=True,
+                                    force_0_100_bounds=False)
+
+
+def brute_force(columns, x, y):
+    d = np.hypot(columns['x'] - x, columns['y'] - y)
+    rows = np.flatnonzero(np.isfinite(d))
+    return rows, d[rows]
+
+
+def queries(columns):
+    finite = np.isfinite(columns['x'])
+    x, y = columns['x'][finite], columns['y'][finite]
+    return [(x[0], y[0]), (x[17], y[17]), (x.mean(), y.mean()),
+            (x.min() - 30, y.max() + 5), (x.max() + 1, y.min() - 1)]
+
+
+def test_radius_matches_brute_force(columns):
+    index = columns_grid_index(columns, cell_size=7.)
+    for x, y in queries(columns):
+        rows, d = brute_force(columns, x, y)
+        for r in (0., 3., 12.5, 1000.):
+            found, found_d = index.radius(x, y, r)
+            assert sorted(found) == sorted(rows[d <= r])
+            assert np.all(np.diff(found_d) >= 0)
+            np.testing.assert_allclose(found_d,
+                                       np.hypot(columns['x'][found] - x,
+                                                columns['y'][found] - y))
+
+
+def test_nearest_matches_brute_force(columns):
+    index = columns_grid_index(columns, cell_size=7.)
+    for x, y in queries(columns):
+        rows, d = brute_force(columns, x, y)
+        for k in (1, 5, 40, len(rows) + 10):
+            found, found_d = index.nearest(x, y, k)
+            np.testing.assert_allclose(found_d, np.sort(d)[:k])
+            np.testing.assert_allclose(
+                found_d, np.hypot(columns['x'][found] - x,
+                                  columns['y'][found] - y))
+
+
+def test_saved_index_round_trip(plot_db, tmp_path):
+    path = str(tmp_path / 'index.npz')
+    compile_csv(plot_db, str(tmp_path / 'out.csv'),
+                output_spatial_index=path)
+    columns = compiler.compile_columns(plot_db, 30)
+    index = columns_grid_index(columns)
+    loaded = load_grid_index(path)
+    for name in ('x', 'y', 'order', 'starts'):
+        np.testing.assert_array_equal(getattr(loaded, name),
+                                      getattr(index, name))
+    assert (loaded.cell_size, loaded.x0, loaded.y0, loaded.nx, loaded.ny) \
+        == (index.cell_size, index.x0, index.y0, index.nx, index.ny)
+    assert list(loaded.ids) == list(columns['id'])
+    for x, y in queries(columns):
+        for a, b in zip(loaded.nearest(x, y, 8), index.nearest(x, y, 8)):
+            np.testing.assert_array_equal(a, b)
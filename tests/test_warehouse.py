@@ -0,0 +1,40 @@
+# coding: utf-8
+
+import os
+import sqlite3
+
+import pytest
+
+import ncpippn_warehouse as warehouse
+
+from conftest import make_plot
+from test_batch_compiler import make_job
+
+
+def test_same_named_databases_are_different_plots(tmp_path):
+    jobs = []
+    for site in ('site1', 'site2'):
+        os.mkdir(str(tmp_path / site))
+        database = str(tmp_path / site / 'p1.epdb')
+        make_plot(database, trees=50)
+        jobs.append(make_job(database, str(tmp_path)))
+    path = str(tmp_path / 'warehouse.sqlite')
+    statuses = warehouse.load_warehouse(path, jobs, processes=1)
+    assert [s['status'] for s in statuses] == ['ok', 'ok']
+    c = sqlite3.connect(path)
+    assert c.execute("SELECT COUNT(*) FROM plot;").fetchone() == (2,)
+
+    # Loading a plot again replaces it.
+    warehouse.load_warehouse(path, jobs[:1], processes=1)
+    assert c.execute("SELECT COUNT(*) FROM plot;").fetchone() == (2,)
+    c.close()
+
+
+def test_duplicate_plot_names_are_refused(plot_db, tmp_path):
+    jobs = [make_job(plot_db, str(tmp_path)) for _ in range(2)]
+    jobs[0]['plot'] = 'p1'
+    jobs[1]['plot'] = 'p1'
+    path = str(tmp_path / 'warehouse.sqlite')
+    with pytest.raises(ValueError):
+        warehouse.load_warehouse(path, jobs, processes=1)
+    assert not os.path.exists(path)